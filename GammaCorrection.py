@@ -2,6 +2,61 @@ import cv2
 import numpy as np
 import os
 
+# Gamma lookup tables built so far in this process, keyed by gamma value.
+_LUT_CACHE = {}
+
+# Outputs apply_gamma_correction can produce.
+CORRECTION_OUTPUTS = ("both", "gamma", "inverse")
+
+
+def gamma_lut(gamma, bit_depth=8):
+    """
+    Return the table mapping v to round(M * (v / M) ** gamma), with M = 2 ** bit_depth - 1.
+
+    bit_depth 8 gives the 256-entry uint8 table, 16 a 65536-entry uint16 table for
+    16-bit frames. Each table is built once per process with vectorised NumPy and
+    then shared (read-only) by every caller.
+    """
+    if bit_depth not in (8, 16):
+        raise ValueError(f"Gamma lookup tables are for 8- or 16-bit images, got {bit_depth} bits.")
+    key = (gamma, bit_depth)
+    lut = _LUT_CACHE.get(key)
+    if lut is None:
+        max_value = 2 ** bit_depth - 1
+        dtype = np.uint8 if bit_depth <= 8 else np.uint16
+        lut = np.rint(max_value * (np.arange(max_value + 1) / max_value) ** gamma).astype(dtype)
+        lut.flags.writeable = False
+        _LUT_CACHE[key] = lut
+    return lut
+
+
+def apply_lut(image, lut, dst=None):
+    """
+    Look every value of a uint8 or uint16 image up in a table of matching size.
+
+    uint8 goes through cv2.LUT; OpenCV has no 16-bit LUT, so uint16 uses np.take.
+    dst may be image itself to work in place.
+    """
+    if image.dtype == np.uint8:
+        return cv2.LUT(image, lut, dst=dst)
+    if image.dtype != np.uint16 or len(lut) != 65536:
+        raise ValueError("Lookup tables apply to uint8 images (256 entries) or uint16 images (65536 entries).")
+    return np.take(lut, image, out=dst)
+
+
+def apply_gamma(image, gamma):
+    """
+    Apply v -> v ** gamma on the image's value range: through the cached lookup table for
+    uint8 and uint16 images, with the power law for float images (values in [0, 1]).
+    Other dtypes raise ValueError.
+    """
+    if image.dtype in (np.uint8, np.uint16):
+        return apply_lut(image, gamma_lut(gamma, image.dtype.itemsize * 8))
+    if np.issubdtype(image.dtype, np.floating):
+        return np.power(np.maximum(image, 0), image.dtype.type(gamma))
+    raise ValueError(f"Gamma correction supports uint8, uint16 and float images, not {image.dtype}.")
+
+
 class GammaCorrection:
     def __init__(self, input_path):
         """
@@ -23,25 +78,50 @@ class GammaCorrection:
         else:
             raise FileNotFoundError(f"File not found: {self.input_path}")
 
-    def apply_gamma_correction(self, gamma):
+    def apply_gamma_correction(self, gamma, output="both", verbose=True):
         """
         Applies gamma correction and inverse gamma correction to the image.
 
         Parameters:
         gamma (float): The gamma value for correction.
+        output (str): "both", or "gamma" / "inverse" to compute only one of the images;
+            the other attribute is left as None.
+        verbose (bool): Print a message once done.
         """
         if self.image is None:
             raise ValueError("Image not loaded. Please load the image first.")
+        if output not in CORRECTION_OUTPUTS:
+            raise ValueError(f"Unknown gamma output: {output}")
+
+        # Lookup tables are cached per gamma value, so only the lookup runs per call
+        self.gamma_image = None
+        self.gamma_corrected_image = None
+        if output in ("both", "gamma"):
+            self.gamma_image = apply_gamma(self.image, gamma)
+        if output in ("both", "inverse"):
+            self.gamma_corrected_image = apply_gamma(self.image, 1 / gamma)
+
+        if verbose:
+            print("Gamma correction applied.")
 
-        # Pre-compute gamma lookup tables for efficiency
-        gamma_table = np.array([255 * ((i / 255) ** gamma) for i in range(256)], dtype=np.uint8)
-        inv_gamma_table = np.array([255 * ((i / 255) ** (1 / gamma)) for i in range(256)], dtype=np.uint8)
+    def apply_gamma_inplace(self, frame, gamma):
+        """
+        Applies the gamma lookup table to a caller-supplied frame buffer in place.
 
-        # Apply lookup tables to each channel
-        self.gamma_image = cv2.LUT(self.image, gamma_table)
-        self.gamma_corrected_image = cv2.LUT(self.image, inv_gamma_table)
+        Nothing is allocated for uint8 frames, which suits per-frame video processing;
+        uint16 frames use the 65536-entry table.
 
-        print("Gamma correction applied.")
+        Parameters:
+        frame (np.ndarray): Contiguous uint8 or uint16 image, overwritten with the result.
+        gamma (float): The gamma value; pass 1 / gamma for the inverse correction.
+
+        Returns:
+        np.ndarray: frame itself.
+        """
+        if frame.dtype not in (np.uint8, np.uint16) or not frame.flags.c_contiguous:
+            raise ValueError("In-place gamma correction needs a contiguous uint8 or uint16 frame.")
+        apply_lut(frame, gamma_lut(gamma, frame.dtype.itemsize * 8), dst=frame)
+        return frame
 
     def save_images(self, gamma_image_path, gamma_corrected_path):
         """
@@ -50,15 +130,20 @@ class GammaCorrection:
         Parameters:
         gamma_image_path (str): File path to save the gamma-corrected image.
         gamma_corrected_path (str): File path to save the inverse gamma-corrected image.
+
+        Either path may be None to skip that image (e.g. after a single-output correction).
         """
-        if self.gamma_image is not None and self.gamma_corrected_image is not None:
-            # Convert RGB to BGR for saving with OpenCV
-            cv2.imwrite(gamma_image_path, cv2.cvtColor(self.gamma_image, cv2.COLOR_RGB2BGR))
-            cv2.imwrite(gamma_corrected_path, cv2.cvtColor(self.gamma_corrected_image, cv2.COLOR_RGB2BGR))
-            print(f"Images saved: {gamma_image_path}, {gamma_corrected_path}")
-        else:
+        requested = [(path, image) for path, image in ((gamma_image_path, self.gamma_image),
+                                                       (gamma_corrected_path, self.gamma_corrected_image))
+                     if path is not None]
+        if not requested or any(image is None for _, image in requested):
             raise ValueError("Gamma-corrected images not available. Apply gamma correction first.")
 
+        for path, image in requested:
+            # Convert RGB to BGR for saving with OpenCV
+            cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        print(f"Images saved: {', '.join(path for path, _ in requested)}")
+
 # Example Usage
 if __name__ == "__main__":
     # Input image path
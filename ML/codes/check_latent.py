@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import torch
+import options.options as option
+from models import create_model
+
+
+def build_model(opt, latent, gaussian_scale=1):
+    """InvDN_Model with the given test latent; the weights depend only on the seed."""
+    opt['test'] = option.dict_to_nonedict(dict(opt['test'] or {}, latent=latent, gaussian_scale=gaussian_scale))
+    torch.manual_seed(0)
+    return create_model(opt)
+
+
+def outputs(model, x, method, repeats, **kwargs):
+    """fake_H of repeats consecutive calls of model.method on x."""
+    results = []
+    for _ in range(repeats):
+        model.feed_test_data(x)
+        getattr(model, method)(**kwargs)
+        results.append(model.fake_H.clone())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the zero and fixed test latents are deterministic.')
+    parser.add_argument('-opt', type=str, default='options/test/test_InvDN.yml', help='Path to options YAML file.')
+    parser.add_argument('-block_num', type=int, nargs=2, default=[2, 2])
+    parser.add_argument('-repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    opt = option.dict_to_nonedict(option.parse(args.opt, is_train=False))
+    opt['gpu_ids'] = None
+    opt['network_G']['block_num'] = args.block_num
+    if opt['path']['pretrain_model_G'] and not os.path.isfile(opt['path']['pretrain_model_G']):
+        print('{} not found: using random weights.'.format(opt['path']['pretrain_model_G']))
+        opt['path']['pretrain_model_G'] = None
+    torch.manual_seed(1)
+    x = torch.rand(2, 3, 64, 96)
+    calls = (('test', {}), ('test', {'self_ensemble': True}), ('MC_test', {'sample_num': 4}))
+
+    results = []
+    for latent in ('zero', 'fixed'):
+        model = build_model(opt, latent)
+        for method, kwargs in calls:
+            runs = outputs(model, x, method, args.repeats, **kwargs)
+            results.append(('{} {}{}: identical over {:d} runs'.format(latent, method, kwargs, args.repeats),
+                            all(torch.equal(runs[0], run) for run in runs[1:])))
+        fresh = build_model(opt, latent)
+        results.append(('{} test: identical in a new model'.format(latent),
+                        torch.equal(outputs(model, x, 'test', 1)[0], outputs(fresh, x, 'test', 1)[0])))
+
+    zero = outputs(build_model(opt, 'zero'), x, 'test', 1)[0]
+    results.append(('zero equals random with gaussian_scale 0',
+                    torch.equal(zero, outputs(build_model(opt, 'random', 0), x, 'test', 1)[0])))
+    random = outputs(build_model(opt, 'random'), x, 'test', 2)
+    results.append(('random test: runs differ', not torch.equal(random[0], random[1])))
+
+    for name, ok in results:
+        print('{}: {}'.format(name, 'ok' if ok else 'FAILED'))
+    if not all(ok for _, ok in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
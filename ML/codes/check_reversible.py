@@ -0,0 +1,62 @@
+import argparse
+import copy
+import sys
+import torch
+from models.modules.Inv_arch import InvNet
+from models.modules.Subnet_constructor import subnet
+
+
+def loss_and_grads(net, x, z, reversible):
+    """The loss shape of InvDN_Model.optimize_parameters; returns the loss and the input and parameter gradients."""
+    net.reversible_training = reversible
+    net.zero_grad()
+    x = x.clone().requires_grad_()
+    output = net(x)
+    y = torch.cat((output[:, :3, :, :], z), dim=1)
+    reconstruction = net(y, rev=True)[:, :3, :, :]
+    loss = (output[:, :3, :, :] ** 2).mean() + (reconstruction - x).abs().mean()
+    loss.backward()
+    return loss.detach(), x.grad, {name: p.grad for name, p in net.named_parameters() if p.requires_grad}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare reversible-backprop gradients of InvNet with autograd.')
+    parser.add_argument('-subnets', nargs='+', choices=['Resnet', 'DBNet'], default=['Resnet', 'DBNet'])
+    parser.add_argument('-block_num', type=int, nargs=2, default=[2, 2])
+    parser.add_argument('-size', type=int, default=32, help='Side of the square test patches.')
+    parser.add_argument('-rtol', type=float, default=1e-7)
+    parser.add_argument('-atol', type=float, default=1e-9)
+    args = parser.parse_args()
+
+    failed = False
+    for subnet_type in args.subnets:
+        torch.manual_seed(0)
+        net = InvNet(3, 3, subnet(subnet_type, 'xavier'), args.block_num, 2).double()
+        # DenseBlock starts with zero output layers; perturb every weight so all gradients are non-trivial
+        with torch.no_grad():
+            for p in net.parameters():
+                if p.requires_grad:
+                    p.add_(0.05 * torch.randn_like(p))
+        x = torch.rand(2, 3, args.size, args.size, dtype=torch.float64)
+        z = torch.randn(2, 45, args.size // 4, args.size // 4, dtype=torch.float64)
+
+        # copy before running: a forward pass leaves non-leaf tensors (the Jacobian terms) on the blocks
+        twin = copy.deepcopy(net)
+        reference = loss_and_grads(net, x, z, reversible=False)
+        reversible = loss_and_grads(twin, x, z, reversible=True)
+
+        same_loss = torch.allclose(reference[0], reversible[0], rtol=args.rtol, atol=args.atol)
+        same_input = torch.allclose(reference[1], reversible[1], rtol=args.rtol, atol=args.atol)
+        worst = max(float((reference[2][name] - grad).abs().max()) for name, grad in reversible[2].items())
+        same_params = all(torch.allclose(reference[2][name], grad, rtol=args.rtol, atol=args.atol)
+                          for name, grad in reversible[2].items())
+        ok = same_loss and same_input and same_params
+        failed = failed or not ok
+        print('{:s}: loss {}, input grad {}, {:d} parameter grads {} (max |diff| {:.2e}) -> {:s}'.format(
+            subnet_type, same_loss, same_input, len(reversible[2]), same_params, worst, 'ok' if ok else 'FAILED'))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import sys
+import torch
+from models.modules.Inv_arch import InvNet
+from models.modules.Subnet_constructor import subnet
+from export_model import DenoiseGraph
+from utils.tiled_inference import TiledDenoiser, pad_to_multiple
+
+
+class GraphModel:
+    """DenoiseGraph behind the feed_test_data / test / fake_H interface of InvDN_Model."""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def feed_test_data(self, data):
+        self.noisy_H = data
+
+    def test(self):
+        with torch.no_grad():
+            self.fake_H = self.graph(self.noisy_H)
+
+
+def receptive_radius(graph, size=256, scale=4):
+    """Farthest input pixel (Chebyshev distance) that changes one scale x scale output block."""
+    x = torch.rand(1, 3, size, size, dtype=torch.float64, requires_grad=True)
+    centre = size // 2 // scale * scale
+    graph(x)[:, :, centre:centre + scale, centre:centre + scale].sum().backward()
+    rows, columns = torch.nonzero(x.grad.abs().sum(dim=(0, 1)), as_tuple=True)
+    return int(max(centre - rows.min(), rows.max() - centre - scale + 1,
+                   centre - columns.min(), columns.max() - centre - scale + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare TiledDenoiser output with whole-frame InvNet inference.')
+    parser.add_argument('-subnet', choices=['Resnet', 'DBNet'], default='Resnet')
+    parser.add_argument('-block_num', type=int, nargs=2, default=[1, 1])
+    parser.add_argument('-tile', type=int, default=256, help='Tile side in pixels.')
+    parser.add_argument('-sizes', type=int, nargs='+', default=[301, 458, 256, 256, 517, 389], metavar='H W',
+                        help='Frame sizes as H W pairs (the defaults are not multiples of 4 or of the tile).')
+    parser.add_argument('-atol', type=float, default=1e-5)
+    args = parser.parse_args()
+    if len(args.sizes) % 2:
+        parser.error('-sizes takes H W pairs.')
+
+    torch.manual_seed(0)
+    net = InvNet(3, 3, subnet(args.subnet, 'xavier'), args.block_num, 2)
+    # perturb every weight so the whole receptive field contributes
+    with torch.no_grad():
+        for p in net.parameters():
+            p.add_(0.05 * torch.randn_like(p))
+    graph = DenoiseGraph(net).eval()
+
+    radius = receptive_radius(graph.double())
+    graph.float()
+    margin = -(-radius // 4) * 4
+    overlap = 2 * margin + 8
+    print('InvNet ({:s}, blocks {}) receptive radius {:d} px: tile {:d}, overlap {:d}, margin {:d}'.format(
+        args.subnet, args.block_num, radius, args.tile, overlap, margin))
+
+    model = GraphModel(graph)
+    tiler = TiledDenoiser(model, args.tile, overlap, multiple=4, margin=margin)
+    failed = False
+    for h, w in zip(args.sizes[::2], args.sizes[1::2]):
+        frame = torch.rand(1, 3, h, w)
+        model.feed_test_data(pad_to_multiple(frame, 4))
+        model.test()
+        whole = model.fake_H[:, :, :h, :w]
+        difference = float((tiler(frame) - whole).abs().max())
+        ok = difference <= args.atol
+        failed = failed or not ok
+        print('{:d}x{:d}: max |tiled - whole frame| = {:.2e} ({:s})'.format(h, w, difference, 'ok' if ok else 'FAILED'))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,43 +3,55 @@ import torch
 import cv2
 import numpy as np
 import argparse
-import options.options as option
-import utils.util as util
-from models import create_model
 from data.util import read_img
+from denoise_video import batch_to_frames
+from utils.exported_model import load_denoiser
+from utils.tiled_inference import TiledDenoiser
 
-def denoise_image(noisy_image_path, output_path, model, opt):
+def denoise_image(noisy_image_path, output_path, model, opt, tile_size=0, tile_overlap=32):
+    """Denoise one image; tile_size > 0 runs the model on overlapping tiles (utils.tiled_inference)."""
     # Load and preprocess the noisy image
     img = read_img(env=None, path=noisy_image_path)  # env=None for direct file loading
     img_tensor = torch.from_numpy(np.transpose(img, (2, 0, 1))).float().unsqueeze(0)  # To tensor and add batch dim
 
-    # Feed the noisy image to the model
-    model.feed_test_data(img_tensor)
-    model.test()
+    if tile_size:
+        # Tiles bound the network's memory and handle sizes that are not a multiple of the scale
+        scale = opt['scale'] if opt is not None else model.scale
+        tiler = TiledDenoiser(model, tile_size, tile_overlap, multiple=scale)
+        denoised_tensor = tiler(img_tensor)
+    else:
+        # Feed the noisy image to the model
+        model.feed_test_data(img_tensor)
+        model.test()
 
-    # Get denoised image from the model
-    denoised_tensor = model.fake_H.detach().float().cpu()
-    denoised_img = util.tensor2img(denoised_tensor)  # Convert to uint8 format
+        # Get denoised image from the model
+        denoised_tensor = model.fake_H.detach().float().cpu()
+    denoised_img = batch_to_frames(denoised_tensor)[0]  # Convert to uint8 format, BGR like the input
 
     # Save the denoised image
-    cv2.imwrite(output_path, cv2.cvtColor(denoised_img, cv2.COLOR_RGB2BGR))
+    cv2.imwrite(output_path, denoised_img)
     print(f"Denoised image saved to: {output_path}")
 
 def main():
     # Parse options and initialize the model
     parser = argparse.ArgumentParser()
-    parser.add_argument('-opt', type=str, required=True, help='Path to options YAML file.')
+    parser.add_argument('-opt', type=str, help='Path to options YAML file.')
+    parser.add_argument('-model', type=str,
+                        help='TorchScript (.pt) or ONNX (.onnx) file from export_model.py, used instead of -opt.')
     parser.add_argument('-noisy_image', type=str, required=True, help='Path to the noisy input image.')
     parser.add_argument('-output_image', type=str, required=True, help='Path to save the denoised image.')
+    parser.add_argument('-tile', type=int, default=0,
+                        help='Tile size for tiled inference (a multiple of the scale; 0 processes the whole image).')
+    parser.add_argument('-tile_overlap', type=int, default=32, help='Overlap between tiles, blended across the seam.')
     args = parser.parse_args()
 
-    # Parse configuration and create the model
-    opt = option.parse(args.opt, is_train=False)
-    opt = option.dict_to_nonedict(opt)
-    model = create_model(opt)
+    # Parse configuration and create the model (or load an exported one)
+    if not args.opt and not args.model:
+        parser.error('one of -opt or -model is required')
+    model, opt = load_denoiser(args.opt, args.model)
 
     # Denoise the input image
-    denoise_image(args.noisy_image, args.output_image, model, opt)
+    denoise_image(args.noisy_image, args.output_image, model, opt, args.tile, args.tile_overlap)
 
 if __name__ == "__main__":
     main()
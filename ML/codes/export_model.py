@@ -0,0 +1,121 @@
+import argparse
+import inspect
+import json
+import os
+import sys
+import torch
+import torch.nn as nn
+import options.options as option
+from models import create_model
+from utils.exported_model import EXPORT_METADATA, ExportedDenoiser
+
+
+class DenoiseGraph(nn.Module):
+    """The whole InvDN denoise path as one module: InvDN_Model.test with the 'zero' latent.
+
+    forward -> keep the 3 low-frequency channels, zero the latent -> reverse -> 3 channels.
+    """
+
+    def __init__(self, net):
+        super(DenoiseGraph, self).__init__()
+        self.net = net
+
+    def forward(self, x):
+        output = self.net(x)
+        y = torch.cat((output[:, :3, :, :], torch.zeros_like(output[:, 3:, :, :])), dim=1)
+        return self.net(y, rev=True)[:, :3, :, :]
+
+
+def max_differences(graph, exported_path, inputs):
+    """Largest absolute difference between the eager graph and an exported file, per input."""
+    exported = ExportedDenoiser(exported_path)
+    differences = []
+    for x in inputs:
+        with torch.no_grad():
+            expected = graph(x)
+        exported.feed_test_data(x)
+        exported.test()
+        differences.append(float((exported.fake_H.float().cpu() - expected).abs().max()))
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the InvDN denoise path to TorchScript and ONNX.')
+    parser.add_argument('-opt', type=str, required=True, help='Path to options YAML file (with pretrain_model_G).')
+    parser.add_argument('-output', type=str, required=True, help='Output path without extension (.pt / .onnx added).')
+    parser.add_argument('-formats', nargs='+', choices=['torchscript', 'onnx'], default=['torchscript', 'onnx'])
+    parser.add_argument('-size', type=int, nargs=2, default=[256, 256], metavar=('H', 'W'),
+                        help='Frame size traced with (H and W stay dynamic).')
+    parser.add_argument('-opset', type=int, default=18,
+                        help='ONNX opset version (the dynamo exporter of torch >= 2.9 writes at least 18).')
+    parser.add_argument('-atol', type=float, default=1e-4, help='Largest accepted difference to the eager model.')
+    args = parser.parse_args()
+
+    opt = option.parse(args.opt, is_train=False)
+    opt = option.dict_to_nonedict(opt)
+    # Tracing and validation run on the CPU, so GPU-less machines can export too
+    opt['gpu_ids'] = None
+    model = create_model(opt)
+    net = model.netG.module.cpu().eval()
+    graph = DenoiseGraph(net).eval()
+    scale = opt['scale']
+    metadata = json.dumps({'scale': scale})
+
+    h, w = args.size
+    if h % scale or w % scale:
+        parser.error('-size must be a multiple of the scale ({}).'.format(scale))
+    example = torch.rand(1, 3, h, w)
+    # Validate at the traced size and at another batch and size, which must go through the dynamic axes
+    inputs = [example, torch.rand(2, 3, h + 2 * scale, w + 4 * scale)]
+
+    failed = False
+    exported = []
+    # torch.jit.save and onnx.save do not create missing folders
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with torch.no_grad():
+        if 'torchscript' in args.formats:
+            path = args.output + '.pt'
+            traced = torch.jit.trace(graph, example)
+            torch.jit.save(traced, path, _extra_files={EXPORT_METADATA: metadata})
+            exported.append(path)
+        if 'onnx' in args.formats:
+            path = args.output + '.onnx'
+            dynamic_axes = {'noisy': {0: 'batch', 2: 'height', 3: 'width'},
+                            'denoised': {0: 'batch', 2: 'height', 3: 'width'}}
+            export_kwargs = {}
+            if 'external_data' in inspect.signature(torch.onnx.export).parameters:
+                # Newer exporters move the weights to path + '.data'; keep one self-contained file
+                export_kwargs['external_data'] = False
+            torch.onnx.export(graph, example, path, input_names=['noisy'], output_names=['denoised'],
+                              dynamic_axes=dynamic_axes, opset_version=args.opset, **export_kwargs)
+            try:
+                import onnx
+            except ImportError:
+                print('onnx is not installed: {} has no scale metadata (loaders assume 4).'.format(path))
+            else:
+                onnx_model = onnx.load(path)
+                onnx.helper.set_model_props(onnx_model, {EXPORT_METADATA: metadata})
+                onnx.save(onnx_model, path)
+                opsets = [entry.version for entry in onnx_model.opset_import if entry.domain in ('', 'ai.onnx')]
+                if opsets and opsets[0] != args.opset:
+                    print('{}: written with opset {} (requested {}).'.format(path, opsets[0], args.opset))
+            exported.append(path)
+
+    for path in exported:
+        if path.endswith('.onnx'):
+            try:
+                import onnxruntime  # noqa: F401
+            except ImportError:
+                print('{}: not validated, onnxruntime is not installed.'.format(path))
+                continue
+        for x, difference in zip(inputs, max_differences(graph, path, inputs)):
+            status = 'ok' if difference <= args.atol else 'FAILED'
+            failed = failed or difference > args.atol
+            print('{} {}: max |exported - eager| = {:.2e} ({})'.format(
+                path, 'x'.join(str(d) for d in x.shape), difference, status))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
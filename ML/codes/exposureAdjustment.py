@@ -1,10 +1,16 @@
 import cv2
 import numpy as np
+from utils.temporal import create_temporal_denoiser
 
 # Input and output video paths
 input_video = "./out.mp4"
 output_video = "./adjusted_128.mp4"
 target_average = 128
+# Frames averaged by the temporal denoiser before brightening (1 disables it, the default);
+# brightening amplifies noise, so e.g. 3 removes some of it first
+temporal_frames = 1
+# "ring" (motion-compensated K-frame buffer) or "recursive" (one state frame, for low-memory devices)
+temporal_mode = "ring"
 
 # Open the input video
 cap = cv2.VideoCapture(input_video)
@@ -20,12 +26,16 @@ fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec for output video
 
 # Initialize the video writer
 out = cv2.VideoWriter(output_video, fourcc, fps, (frame_width, frame_height))
+temporal = create_temporal_denoiser(temporal_mode, temporal_frames)
 
 while True:
     ret, frame = cap.read()
     if not ret:  # Break the loop if no frames are left
         break
 
+    if temporal is not None:
+        frame = temporal(frame)
+
     # Convert frame to grayscale (optional if you want per-channel adjustment)
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     
@@ -0,0 +1,79 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import torch
+import options.options as option
+import models.networks as networks
+
+# RESOLUTIONS and peak_rss_mb are shared with the pipeline benchmarks in the repository root;
+# appended so the root modules never shadow the ones in this folder (e.g. denoise.py).
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from benchmarkUtils import RESOLUTIONS, peak_rss_mb  # noqa: E402
+
+
+def measure(opt, resolution, lean, output_path):
+    """Run one forward + reverse pass of InvNet on a random frame, print the peak RSS and save the output."""
+    torch.manual_seed(0)
+    netG = networks.define_G(opt)
+    netG.eval()
+    netG.lean_inference = lean
+    h, w = RESOLUTIONS[resolution]
+    x = torch.rand(1, opt['network_G']['in_nc'], h, w)
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        output = netG(x=x)
+        y = torch.cat((output[:, :3, :, :], torch.zeros_like(output[:, 3:, :, :])), dim=1)
+        del output
+        fake_H = netG(x=y, rev=True)[:, :3, :, :]
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    torch.save(fake_H, output_path)
+    print('{:s} {:.1f} {:.1f} {:.3f}'.format('lean' if lean else 'eager', baseline, peak, seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak RSS of InvNet inference, eager autograd-free vs lean path.')
+    parser.add_argument('-opt', type=str, default='options/test/test_InvDN.yml', help='Path to options YAML file.')
+    parser.add_argument('-resolution', choices=list(RESOLUTIONS), default='1080p')
+    parser.add_argument('-subnet', choices=['Resnet', 'DBNet'], help='Override the subnet type of the options file.')
+    parser.add_argument('-atol', type=float, default=1e-4, help='Largest accepted difference between the paths.')
+    parser.add_argument('-mode', choices=['eager', 'lean'], help=argparse.SUPPRESS)
+    parser.add_argument('-save', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    opt = option.dict_to_nonedict(option.parse(args.opt, is_train=False))
+    if args.subnet:
+        opt['network_G']['which_model_G']['subnet_type'] = args.subnet
+    if args.mode:
+        measure(opt, args.resolution, args.mode == 'lean', args.save)
+        return
+    if peak_rss_mb() is None:
+        parser.error('peak RSS needs /proc or the resource module (Linux or macOS).')
+
+    # The peak only grows, so every path runs in a fresh process.
+    print('InvNet ({:s}) inference on a {:s} frame (random weights, zero latent)'.format(
+        opt['network_G']['which_model_G']['subnet_type'], args.resolution))
+    print('{:>6} {:>14} {:>14} {:>8}'.format('path', 'model MB', 'peak RSS MB', 'seconds'))
+    outputs = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for mode in ('eager', 'lean'):
+            outputs[mode] = os.path.join(folder, mode + '.pt')
+            command = [sys.executable, os.path.abspath(__file__), '-opt', args.opt, '-resolution', args.resolution,
+                       '-mode', mode, '-save', outputs[mode]]
+            if args.subnet:
+                command += ['-subnet', args.subnet]
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+            print('{:>6} {:>14} {:>14} {:>8}'.format(*result.stdout.split()[-4:]))
+        difference = float((torch.load(outputs['lean']) - torch.load(outputs['eager'])).abs().max())
+    print('max |lean - eager| = {:.2e} ({:s})'.format(difference, 'ok' if difference <= args.atol else 'FAILED'))
+    if difference > args.atol:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
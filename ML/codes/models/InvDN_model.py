@@ -11,6 +11,10 @@ from models.modules.loss import ReconstructionLoss, Gradient_Loss, SSIM_Loss
 
 logger = logging.getLogger('base')
 
+# Test-time latents for the reverse pass: a fresh Gaussian sample per call, zeros, or one
+# sample drawn once (from test_opt['latent_seed']) and reused for every frame.
+LATENT_MODES = ('random', 'zero', 'fixed')
+
 class InvDN_Model(BaseModel):
     def __init__(self, opt):
         super(InvDN_Model, self).__init__(opt)
@@ -23,12 +27,17 @@ class InvDN_Model(BaseModel):
         test_opt = opt['test']
         self.train_opt = train_opt
         self.test_opt = test_opt
+        # Reverse-pass inputs with a deterministic latent, keyed by shape (see latent_input)
+        self.latent_cache = {}
 
         self.netG = networks.define_G(opt).to(self.device)
         if opt['dist']:
             self.netG = DistributedDataParallel(self.netG, device_ids=[torch.cuda.current_device()])
         else:
             self.netG = DataParallel(self.netG)
+        if self.is_train and train_opt['reversible_backprop']:
+            # Trade about one extra forward pass for not storing the InvBlockExp activations
+            self.netG.module.reversible_training = True
         # print network
         self.print_network()
         self.load()
@@ -89,6 +98,41 @@ class InvDN_Model(BaseModel):
     def gaussian_batch(self, dims):
         return torch.randn(tuple(dims)).to(self.device)
 
+    def latent_mode(self, gaussian_scale):
+        mode = self.test_opt['latent'] if self.test_opt and self.test_opt['latent'] else 'random'
+        if mode not in LATENT_MODES:
+            raise NotImplementedError('Latent mode [{:s}] not recognized.'.format(mode))
+        if gaussian_scale == 0:
+            return 'zero'
+        return mode
+
+    def latent_input(self, output, gaussian_scale):
+        '''Reverse-pass input at test time: the LR channels of a forward output and a latent z.
+
+        With a deterministic latent ('zero', 'fixed' or gaussian_scale 0) the input lives in a
+        buffer cached per shape whose latent channels are filled once, so each call only copies
+        the LR channels: no random numbers and no new allocation per frame. The buffer is reused
+        by the next call of the same shape, so run the reverse pass before calling again.'''
+        mode = self.latent_mode(gaussian_scale)
+        if mode == 'random':
+            return torch.cat((output[:, :3, :, :], gaussian_scale * self.gaussian_batch(output[:, 3:, :, :].shape)), dim=1)
+
+        key = (mode, gaussian_scale, tuple(output.shape), output.dtype, output.device)
+        y_forw = self.latent_cache.get(key)
+        if y_forw is None:
+            y_forw = torch.empty_like(output)
+            if mode == 'zero':
+                y_forw[:, 3:, :, :].zero_()
+            else:
+                # One draw per frame size, shared by every frame of a batch
+                seed = self.test_opt['latent_seed'] if self.test_opt['latent_seed'] is not None else 0
+                generator = torch.Generator().manual_seed(seed)
+                z = torch.randn(tuple(output[:1, 3:, :, :].shape), generator=generator)
+                y_forw[:, 3:, :, :] = gaussian_scale * z.to(output.device, output.dtype)
+            self.latent_cache[key] = y_forw
+        y_forw[:, :3, :, :].copy_(output[:, :3, :, :])
+        return y_forw
+
     def loss_forward(self, out, y):
         l_forw_fit = self.train_opt['lambda_fit_forw'] * self.Reconstruction_forw(out, y)
         # l_forw_grad = 0.1* self.train_opt['lambda_fit_forw'] * self.Rec_Forw_grad(out, y)
@@ -152,7 +196,7 @@ class InvDN_Model(BaseModel):
             else:
                 output = self.netG(x=self.input)
                 self.forw_L = output[:, :3, :, :]
-                y_forw = torch.cat((output[:, :3, :, :], gaussian_scale * self.gaussian_batch(output[:, 3:, :, :].shape)), dim=1)
+                y_forw = self.latent_input(output, gaussian_scale)
                 self.fake_H = self.netG(x=y_forw, rev=True)[:, :3, :, :]
 
         self.netG.train()
@@ -164,6 +208,10 @@ class InvDN_Model(BaseModel):
         if self.test_opt and self.test_opt['gaussian_scale'] != None:
             gaussian_scale = self.test_opt['gaussian_scale']
 
+        # A deterministic latent gives the same sample every time: one reverse pass is enough
+        if self.latent_mode(gaussian_scale) != 'random':
+            sample_num = 1
+
         self.netG.eval()
         with torch.no_grad():
             if self_ensemble:
@@ -174,7 +222,7 @@ class InvDN_Model(BaseModel):
                 self.forw_L = output[:, :3, :, :]
                 fake_Hs = []
                 for i in range(sample_num):
-                    y_forw = torch.cat((output[:, :3, :, :], gaussian_scale * self.gaussian_batch(output[:, 3:, :, :].shape)), dim=1)
+                    y_forw = self.latent_input(output, gaussian_scale)
                     fake_Hs.append(self.netG(x=y_forw, rev=True)[:, :3, :, :])
                 fake_H = torch.cat(fake_Hs, dim=0)
                 self.fake_H = fake_H.mean(dim=0, keepdim=True)
@@ -231,11 +279,8 @@ class InvDN_Model(BaseModel):
             noise_list.extend([_transform(t, tf) for t in noise_list])
 
         lr_list = [forward_function(aug) for aug in noise_list]
-        back_list = []
-        for data in lr_list:
-            y_forw = torch.cat((data[:, :3, :, :], gaussian_scale * self.gaussian_batch(data[:, 3:, :, :].shape)), dim=1)
-            back_list.append(y_forw)
-        sr_list = [forward_function(data, rev=True) for data in back_list]
+        # Reverse each input right away: deterministic latent inputs share a cached buffer
+        sr_list = [forward_function(self.latent_input(data, gaussian_scale), rev=True) for data in lr_list]
 
         for i in range(len(sr_list)):
             if i > 3:
@@ -272,7 +317,7 @@ class InvDN_Model(BaseModel):
         for data in lr_list:
             fake_Hs = []
             for i in range(sample_num):
-                y_forw = torch.cat((data[:, :3, :, :], gaussian_scale * self.gaussian_batch(data[:, 3:, :, :].shape)), dim=1)
+                y_forw = self.latent_input(data, gaussian_scale)
                 fake_Hs.append(self.netG(x=y_forw, rev=True)[:, :3, :, :])
             fake_H = torch.cat(fake_Hs, dim=0)
             fake_H = fake_H.mean(dim=0, keepdim=True)
@@ -87,7 +87,7 @@ class BaseModel():
     def load_network(self, load_path, network, strict=True):
         if isinstance(network, nn.DataParallel) or isinstance(network, DistributedDataParallel):
             network = network.module
-        load_net = torch.load(load_path)
+        load_net = torch.load(load_path, map_location=self.device)
         load_net_clean = OrderedDict()  # remove unnecessary 'module.'
         for k, v in load_net.items():
             if k.startswith('module.'):
@@ -5,6 +5,12 @@ import torch.nn.functional as F
 import numpy as np
 
 
+def _subnet_inference(subnet, x):
+    '''Run a subnet through its autograd-free inference path when it has one (DenseBlock).'''
+    inference = getattr(subnet, 'inference', None)
+    return inference(x) if inference is not None else subnet(x)
+
+
 class InvBlockExp(nn.Module):
     def __init__(self, subnet_constructor, channel_num, channel_split_num, clamp=1.):
         super(InvBlockExp, self).__init__()
@@ -32,6 +38,25 @@ class InvBlockExp(nn.Module):
 
         return torch.cat((y1, y2), 1)
 
+    def inference(self, x, rev=False):
+        '''forward without autograd, overwriting x with the output.
+
+        x1 and x2 are views of x and are updated in place with the same operations
+        as forward, so no torch.cat output is allocated and self.s is not kept (jacobian
+        is unavailable afterwards).'''
+        x1, x2 = (x.narrow(1, 0, self.split_len1), x.narrow(1, self.split_len1, self.split_len2))
+
+        if not rev:
+            x1.add_(_subnet_inference(self.F, x2))
+            scale = _subnet_inference(self.H, x1).sigmoid_().mul_(2).sub_(1).mul_(self.clamp).exp_()
+            x2.mul_(scale).add_(_subnet_inference(self.G, x1))
+        else:
+            scale = _subnet_inference(self.H, x1).sigmoid_().mul_(2).sub_(1).mul_(self.clamp).exp_()
+            x2.sub_(_subnet_inference(self.G, x1)).div_(scale)
+            x1.sub_(_subnet_inference(self.F, x2))
+
+        return x
+
     def jacobian(self, x, rev=False):
         if not rev:
             jac = torch.sum(self.s)
@@ -41,6 +66,47 @@ class InvBlockExp(nn.Module):
         return jac / x.shape[0]
 
 
+class ReversibleSequence(torch.autograd.Function):
+    '''Consecutive InvBlockExp blocks trained without storing their activations.
+
+    forward runs the blocks without autograd and keeps only the final output. backward
+    walks the blocks from the last one: it reconstructs each block's input from its
+    output with the inverse direction, reruns that one block with autograd on and
+    backpropagates through it. Activation memory is that of a single block, for about
+    one extra forward pass; reconstructed inputs match the originals up to float
+    rounding.
+
+    Call as ReversibleSequence.apply(x, blocks, rev, *params), where params are the
+    trainable parameters of blocks in order.'''
+
+    @staticmethod
+    def forward(ctx, x, blocks, rev, *params):
+        ctx.blocks = blocks
+        ctx.rev = rev
+        out = x.clone()
+        for block in blocks:
+            out = block.inference(out, rev)
+        ctx.save_for_backward(out)
+        return out
+
+    @staticmethod
+    def backward(ctx, grad_out):
+        out, = ctx.saved_tensors
+        out = out.detach()
+        param_grads = []
+        for block in reversed(ctx.blocks):
+            with torch.no_grad():
+                x = block.inference(out.clone(), not ctx.rev)
+            with torch.enable_grad():
+                x_in = x.detach().requires_grad_()
+                params = [p for p in block.parameters() if p.requires_grad]
+                grads = torch.autograd.grad(block(x_in, ctx.rev), [x_in] + params, grad_out, allow_unused=True)
+            grad_out = grads[0]
+            param_grads = list(grads[1:]) + param_grads
+            out = x
+        return (grad_out, None, None) + tuple(param_grads)
+
+
 class HaarDownsampling(nn.Module):
     def __init__(self, channel_in):
         super(HaarDownsampling, self).__init__()
@@ -101,8 +167,17 @@ class InvNet(nn.Module):
                 operations.append(b)
 
         self.operations = nn.ModuleList(operations)
+        # Take the in-place inference path when autograd is off and not tracing for export (see inference)
+        self.lean_inference = True
+        # Recompute block activations in backward instead of storing them (see ReversibleSequence)
+        self.reversible_training = False
 
     def forward(self, x, rev=False, cal_jacobian=False):
+        if self.lean_inference and not cal_jacobian and not torch.is_grad_enabled() and not torch.jit.is_tracing():
+            return self.inference(x, rev)
+        if self.reversible_training and not cal_jacobian:
+            return self.reversible_forward(x, rev)
+
         out = x
         jacobian = 0
 
@@ -120,4 +195,41 @@ class InvNet(nn.Module):
         if cal_jacobian:
             return out, jacobian
         else:
-            return out
\ No newline at end of file
+            return out
+
+    def inference(self, x, rev=False):
+        '''forward under torch.no_grad with activation memory of about one block.
+
+        Only the current tensor is alive between operations: InvBlockExp steps update it
+        in place (InvBlockExp.inference) and each HaarDownsampling output replaces it.
+        The input itself is never modified.'''
+        operations = self.operations if not rev else reversed(self.operations)
+        out = x
+        owned = False
+        for op in operations:
+            if isinstance(op, InvBlockExp):
+                if not owned:
+                    out = out.clone()
+                    owned = True
+                out = op.inference(out, rev)
+            else:
+                out = op.forward(out, rev)
+                owned = True
+        return out
+
+    def reversible_forward(self, x, rev=False):
+        '''forward for training where each run of InvBlockExp steps is a ReversibleSequence.'''
+        operations = list(self.operations) if not rev else list(reversed(self.operations))
+        out = x
+        blocks = []
+        for op in operations + [None]:
+            if isinstance(op, InvBlockExp):
+                blocks.append(op)
+                continue
+            if blocks:
+                params = [p for block in blocks for p in block.parameters() if p.requires_grad]
+                out = ReversibleSequence.apply(out, blocks, rev, *params)
+                blocks = []
+            if op is not None:
+                out = op.forward(out, rev)
+        return out
@@ -57,4 +57,15 @@ class DenseBlock(nn.Module):
         x3 = self.lrelu(self.conv3(torch.cat((x, x1, x2), 1)))
         x4 = self.lrelu(self.conv4(torch.cat((x, x1, x2, x3), 1)))
         x5 = self.conv5(torch.cat((x, x1, x2, x3, x4), 1))
-        return x5
\ No newline at end of file
+        return x5
+
+    def inference(self, x):
+        # forward for InvBlockExp.inference (no autograd): the growing concatenations share one
+        # preallocated buffer, each conv reading the leading channels and writing its features after them.
+        c, gc = x.shape[1], self.conv1.out_channels
+        features = x.new_empty((x.shape[0], c + 4 * gc) + x.shape[2:])
+        features[:, :c] = x
+        for i, conv in enumerate((self.conv1, self.conv2, self.conv3, self.conv4)):
+            width = c + i * gc
+            features[:, width:width + gc] = self.lrelu(conv(features[:, :width]))
+        return self.conv5(features)
@@ -0,0 +1,67 @@
+import json
+import torch
+
+# Extra file in exported TorchScript archives (and ONNX metadata key) holding the export settings.
+EXPORT_METADATA = 'invdn_export.json'
+
+
+class ExportedDenoiser:
+    """Denoise graph written by export_model.py, behind the InvDN_Model test interface.
+
+    feed_test_data, test and fake_H behave as in InvDN_Model with the 'zero' test latent,
+    so denoise.py and denoise_video.py run it unchanged, without the models and options
+    packages (or torchvision and yaml). TorchScript (.pt) files run with torch.jit.load;
+    ONNX (.onnx) files run with onnxruntime, imported only for them.
+
+    Args:
+        path (str): exported .pt or .onnx file.
+        device (str): torch device for TorchScript files (ONNX runs on the CPU).
+    """
+
+    def __init__(self, path, device='cpu'):
+        self.path = path
+        self.device = torch.device(device)
+        metadata = {}
+        if path.lower().endswith('.onnx'):
+            import onnxruntime
+            self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+            self.module = None
+            stored = self.session.get_modelmeta().custom_metadata_map.get(EXPORT_METADATA)
+            if stored:
+                metadata = json.loads(stored)
+        else:
+            extra_files = {EXPORT_METADATA: ''}
+            self.module = torch.jit.load(path, map_location=self.device, _extra_files=extra_files)
+            self.module.eval()
+            self.session = None
+            if extra_files[EXPORT_METADATA]:
+                metadata = json.loads(extra_files[EXPORT_METADATA])
+        # H and W divisor of the network (2 ** number of Haar levels)
+        self.scale = metadata.get('scale', 4)
+
+    def feed_test_data(self, data):
+        self.noisy_H = data.to(self.device)  # Noisy
+
+    def test(self):
+        with torch.no_grad():
+            if self.module is not None:
+                self.fake_H = self.module(self.noisy_H)
+            else:
+                noisy = self.noisy_H.detach().float().cpu().numpy()
+                self.fake_H = torch.from_numpy(self.session.run(None, {'noisy': noisy})[0])
+
+
+def load_denoiser(opt_path=None, model_path=None, device='cpu'):
+    """Model for the denoise scripts: an ExportedDenoiser for model_path, otherwise the
+    InvDN_Model described by the options file. The training stack is imported only then.
+
+    Returns:
+        model, and its parsed options (None for an exported model).
+    """
+    if model_path:
+        return ExportedDenoiser(model_path, device), None
+    import options.options as option
+    from models import create_model
+    opt = option.parse(opt_path, is_train=False)
+    opt = option.dict_to_nonedict(opt)
+    return create_model(opt), opt
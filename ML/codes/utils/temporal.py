@@ -0,0 +1,245 @@
+from collections import deque
+import cv2
+import numpy as np
+
+# Optical flow engines understood by TemporalDenoiser.
+FLOW_METHODS = ('dis', 'farneback')
+
+
+def pixel_grid(h, w):
+    """HxWx2 float32 array holding the (x, y) coordinates of every pixel."""
+    grid_x, grid_y = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    return cv2.merge((grid_x, grid_y))
+
+
+def remap_with_mask(img, sample_map):
+    """Bilinearly sample img at an HxWx2 map of (x, y) positions.
+
+    Returns:
+        ndarray: sampled image (out-of-frame samples are 0).
+        ndarray: HxW uint8 mask, 255 where the sample fell inside the frame.
+    """
+    h, w = img.shape[:2]
+    warped = cv2.remap(img, sample_map, None, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+    inside = cv2.inRange(sample_map, (0, 0), (w - 1, h - 1))
+    return warped, inside
+
+
+def warp_by_flow(img, flow, grid=None):
+    """Backward-warp an image with a dense flow field, like module_util.flow_warp on CPU.
+
+    Output pixel (y, x) samples img at (y + flow[y, x, 1], x + flow[y, x, 0]) bilinearly.
+
+    Args:
+        img (ndarray): HxW or HxWxC image.
+        flow (ndarray): HxWx2 float32 flow (dx, dy) in pixels.
+        grid (ndarray): optional pixel_grid(H, W) to reuse.
+
+    Returns:
+        ndarray: warped image (out-of-frame samples are 0).
+        ndarray: HxW uint8 mask, 255 where the sample fell inside the frame.
+    """
+    if grid is None:
+        grid = pixel_grid(*flow.shape[:2])
+    return remap_with_mask(img, cv2.add(flow, grid))
+
+
+class TemporalDenoiser:
+    """Motion-compensated temporal averaging over a ring buffer of recent frames.
+
+    Every call aligns the last K - 1 input frames to the new frame with dense optical
+    flow (DIS or Farneback), warps them with cv2.remap and averages them with the new
+    frame. Each warped frame is weighted per pixel by a motion confidence mask: the
+    weight falls linearly from 1 to 0 as the smoothed difference to the new frame
+    grows to motion_threshold, so occlusions and flow failures fall back to the
+    current frame instead of ghosting. The filter is causal and needs no look-ahead,
+    so it drops into per-frame video loops.
+
+    Args:
+        num_frames (int): K, frames averaged including the current one.
+        flow_method (str): one of FLOW_METHODS.
+        flow_scale (float): flow is estimated on frames resized by this factor, which
+            is much cheaper and more robust to noise; the flow is upsampled for warping.
+        motion_threshold (float): difference (in 8-bit grey levels) at which a warped
+            pixel gets zero weight.
+    """
+
+    def __init__(self, num_frames=3, flow_method='dis', flow_scale=0.5, motion_threshold=24.0):
+        if num_frames < 1:
+            raise ValueError('num_frames must be at least 1.')
+        if flow_method not in FLOW_METHODS:
+            raise ValueError('Unknown flow method: {}'.format(flow_method))
+        self.num_frames = num_frames
+        self.flow_method = flow_method
+        self.flow_scale = flow_scale
+        self.motion_threshold = float(motion_threshold)
+        # Previous inputs as (frame with its smoothed grey image as an extra channel, small grey for the flow)
+        self.history = deque(maxlen=num_frames - 1)
+        # Confidence per absolute grey difference, in 1/255 steps so it stays 8-bit
+        self._confidence_lut = np.clip(np.rint(255 * (1 - np.arange(256) / self.motion_threshold)),
+                                       0, 255).astype(np.uint8)
+        self._grid = None
+        self._dis = None
+        if flow_method == 'dis':
+            self._dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST)
+
+    def reset(self):
+        """Forget the buffered frames, e.g. at a scene cut."""
+        self.history.clear()
+
+    def _prepare(self, frame):
+        """Frame stacked with its smoothed grey image, and a resized grey image for the flow."""
+        grey = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Compare smoothed frames so noise alone does not lower the confidence.
+        grey = cv2.GaussianBlur(grey, (5, 5), 0)
+        small = grey
+        if self.flow_scale != 1:
+            small = cv2.resize(grey, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA)
+        # One extra channel lets a single remap warp the frame and its grey image together.
+        stacked = cv2.merge(list(cv2.split(frame)) + [grey])
+        return stacked, small
+
+    def _sample_map(self, current_small, previous_small):
+        """Where each pixel of the current frame lies in a previous one (pixel grid + flow)."""
+        if self._dis is not None:
+            flow = self._dis.calc(current_small, previous_small, None)
+        else:
+            flow = cv2.calcOpticalFlowFarneback(current_small, previous_small, None,
+                                                0.5, 3, 15, 3, 5, 1.2, 0)
+        if self.flow_scale == 1:
+            return cv2.add(flow, self._grid)
+        h, w = self._grid.shape[:2]
+        flow = cv2.resize(flow, (w, h), interpolation=cv2.INTER_LINEAR)
+        # Upsampled flow is in small-frame pixels: rescale and add the grid in one pass.
+        return cv2.scaleAdd(flow, 1.0 / self.flow_scale, self._grid)
+
+    def __call__(self, frame):
+        """Denoise one HxW or HxWx3 uint8 frame.
+
+        Returns:
+            ndarray: the filtered frame (uint8, same shape as the input).
+        """
+        if frame.dtype != np.uint8:
+            raise ValueError('TemporalDenoiser expects uint8 frames.')
+        stacked, small = self._prepare(frame)
+        h, w = stacked.shape[:2]
+        channels = stacked.shape[2]
+        if self._grid is None or self._grid.shape[:2] != (h, w):
+            self._grid = pixel_grid(h, w)
+            self.history.clear()
+
+        # Weighted sums in units of 1/255: the current frame has full confidence.
+        accumulator = stacked.astype(np.float32)
+        accumulator *= 255
+        weight_sum = np.full((h, w), 255, dtype=np.float32)
+        grey = stacked[:, :, -1]
+        for previous, previous_small in self.history:
+            warped, inside = remap_with_mask(previous, self._sample_map(small, previous_small))
+
+            # Motion confidence: 255 where the aligned frame agrees, 0 from motion_threshold on.
+            confidence = cv2.LUT(cv2.absdiff(warped[:, :, -1], grey), self._confidence_lut)
+            cv2.accumulateProduct(warped, cv2.merge([confidence] * channels), accumulator, mask=inside)
+            cv2.accumulate(confidence, weight_sum, mask=inside)
+
+        self.history.append((stacked, small))
+        filtered = cv2.divide(accumulator, cv2.merge([weight_sum] * channels), dtype=cv2.CV_8U)
+        if frame.ndim == 2:
+            return cv2.extractChannel(filtered, 0)
+        return cv2.cvtColor(filtered, cv2.COLOR_BGRA2BGR)
+
+
+class RecursiveDenoiser:
+    """Motion-adaptive recursive (IIR) temporal filter with O(1) memory per pixel.
+
+    Each pixel keeps one filtered value x, updated in place with the new frame z as
+    x += g * (z - x). The gain g is 2 / (num_frames + 1) where the scene is static,
+    which averages noise like a num_frames-frame window, and rises linearly to 1 (take
+    the new frame) as the local luma difference z - x, averaged over a 5x5 window,
+    reaches motion_threshold in magnitude, so moving content does not ghost.
+
+    State is a single float32 frame, updated in place. Besides it the filter keeps one
+    single-channel float32 gain map and an 8-bit grey image, allocated once, plus a
+    temporary for a band of band_rows rows while the state is updated; no ring buffer
+    or full-frame difference is stored.
+
+    Args:
+        num_frames (int): effective number of frames averaged in static areas.
+        motion_threshold (float): smoothed luma difference (8-bit grey levels) at which
+            the new frame is taken as is.
+        band_rows (int): rows updated at a time, which bounds the update's temporary.
+    """
+
+    def __init__(self, num_frames=5, motion_threshold=24.0, band_rows=64):
+        if num_frames < 1:
+            raise ValueError('num_frames must be at least 1.')
+        self.num_frames = num_frames
+        self.min_gain = 2.0 / (num_frames + 1)
+        self.motion_threshold = float(motion_threshold)
+        self.band_rows = max(1, band_rows)
+        self.state = None
+        self._grey = None
+        self._gain = None
+
+    def reset(self):
+        """Drop the filter state, e.g. at a scene cut."""
+        self.state = None
+
+    def __call__(self, frame):
+        """Denoise one HxW or HxWx3 uint8 frame.
+
+        Returns:
+            ndarray: the filtered frame (uint8, same shape as the input).
+        """
+        if frame.dtype != np.uint8:
+            raise ValueError('RecursiveDenoiser expects uint8 frames.')
+        if self.state is None or self.state.shape != frame.shape:
+            self.state = frame.astype(np.float32)
+            self._grey = np.empty(frame.shape[:2], dtype=np.uint8)
+            self._gain = np.empty(frame.shape[:2], dtype=np.float32)
+            return frame.copy()
+
+        state, gain = self.state, self._gain
+        # Luma is linear, so the luma of z - x is luma(z) - luma(x): no colour difference buffer.
+        if frame.ndim == 3:
+            cv2.cvtColor(state, cv2.COLOR_BGR2GRAY, dst=gain)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._grey)
+            cv2.subtract(self._grey, gain, dst=gain, dtype=cv2.CV_32F)
+        else:
+            cv2.subtract(frame, state, dst=gain, dtype=cv2.CV_32F)
+        # Average the signed difference before taking its magnitude: noise cancels out, motion does not.
+        cv2.blur(gain, (5, 5), dst=gain)
+        np.abs(gain, out=gain)
+
+        # gain = min_gain + (1 - min_gain) * min(1, d / motion_threshold)
+        np.minimum(gain, self.motion_threshold, out=gain)
+        gain *= (1.0 - self.min_gain) / self.motion_threshold
+        gain += self.min_gain
+
+        # x += g * (z - x), a band of rows at a time
+        if frame.ndim == 3:
+            gain = gain[:, :, None]
+        for top in range(0, frame.shape[0], self.band_rows):
+            rows = slice(top, top + self.band_rows)
+            band = np.subtract(frame[rows], state[rows], dtype=np.float32)
+            band *= gain[rows]
+            state[rows] += band
+        return cv2.convertScaleAbs(state)
+
+
+# Temporal filters available to the video loops.
+TEMPORAL_MODES = ('ring', 'recursive')
+
+
+def create_temporal_denoiser(mode='ring', num_frames=1):
+    """Temporal filter for a per-frame video loop, or None when num_frames <= 1.
+
+    'ring' is TemporalDenoiser (motion-compensated, keeps num_frames - 1 frames);
+    'recursive' is RecursiveDenoiser (one state frame, no motion compensation).
+    """
+    if mode not in TEMPORAL_MODES:
+        raise ValueError('Unknown temporal mode: {}'.format(mode))
+    if num_frames <= 1:
+        return None
+    if mode == 'recursive':
+        return RecursiveDenoiser(num_frames)
+    return TemporalDenoiser(num_frames)
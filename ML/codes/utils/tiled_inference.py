@@ -0,0 +1,124 @@
+import torch
+import torch.nn.functional as F
+
+
+def pad_to_multiple(batch, multiple=4):
+    """Pad an NxCxHxW tensor on the bottom and right to H and W divisible by multiple.
+
+    InvNet halves the frame once per HaarDownsampling level, so with scale 4 (two levels)
+    both sides must be multiples of 4. Border pixels are replicated.
+    """
+    h, w = batch.shape[-2:]
+    pad_h, pad_w = -h % multiple, -w % multiple
+    if pad_h or pad_w:
+        batch = F.pad(batch, (0, pad_w, 0, pad_h), mode='replicate')
+    return batch
+
+
+def tile_origins(length, tile, overlap, multiple=1):
+    """Start offsets of tiles of size tile covering [0, length), overlapping by at least overlap.
+
+    Offsets are multiples of multiple (length and tile must be), so every tile sees the
+    same HaarDownsampling grid as the whole frame.
+    """
+    if length <= tile:
+        return [0]
+    step = (tile - overlap) // multiple * multiple
+    origins = list(range(0, length - tile, step))
+    origins.append(length - tile)
+    return origins
+
+
+def edge_ramp(n, overlap, margin, start_inside, end_inside):
+    """Weights of n pixels along one side of a tile.
+
+    Next to a tile edge inside the frame, the first margin pixels (which miss context
+    of the neighbouring tile) get no weight and the next overlap - 2 * margin pixels ramp
+    linearly up to 1. Edges on the frame border are not faded.
+    """
+    i = torch.arange(n, dtype=torch.float32)
+    weight = torch.ones(n)
+    span = overlap - 2 * margin + 1
+    if start_inside:
+        weight = torch.minimum(weight, ((i - margin + 1) / span).clamp(0, 1))
+    if end_inside:
+        weight = torch.minimum(weight, ((n - i - margin) / span).clamp(0, 1))
+    return weight
+
+
+def blend_window(y, x, tile_h, tile_w, frame_h, frame_w, overlap, margin=0):
+    """1xHxW weights of the tile at (y, x) of a frame_h x frame_w frame (see edge_ramp).
+
+    Neighbouring tiles overlap by at least overlap >= 2 * margin pixels, so every pixel
+    keeps a positive total weight.
+    """
+    rows = edge_ramp(tile_h, overlap, margin, y > 0, y + tile_h < frame_h)
+    columns = edge_ramp(tile_w, overlap, margin, x > 0, x + tile_w < frame_w)
+    return (rows[:, None] * columns[None, :]).unsqueeze(0)
+
+
+class TiledDenoiser:
+    """Denoise frames of any size with InvDN_Model.test, tile by tile.
+
+    The frames are padded to a multiple of the network's scale, cut into overlapping
+    tiles, and the tiles are sent through the model tiles_per_batch positions at a
+    time (for every frame of the batch at once). Denoised tiles are weighted by
+    blend_window and accumulated, so seams are cross-faded over the overlap. Pixels
+    within margin of a tile edge inside the frame are dropped; when margin covers the
+    receptive field radius of the network the result equals whole-frame inference up to
+    float rounding (check_tiled_inference.py). Peak memory of the network depends on the
+    tile size and tiles_per_batch, not on the frame size; only the accumulated output
+    is frame sized.
+
+    Args:
+        model: InvDN_Model (uses feed_test_data, test and fake_H).
+        tile_size (int): tile side in pixels, a multiple of multiple.
+        overlap (int): pixels shared by neighbouring tiles.
+        tiles_per_batch (int): tile positions denoised per test() call.
+        multiple (int): H and W divisor InvNet needs (its scale, 2 ** down_num).
+        margin (int): pixels dropped next to inner tile edges, at most overlap // 2
+            (default overlap // 4).
+    """
+
+    def __init__(self, model, tile_size=256, overlap=32, tiles_per_batch=4, multiple=4, margin=None):
+        if tile_size % multiple:
+            raise ValueError('tile_size must be a multiple of {}.'.format(multiple))
+        if not 0 <= overlap <= tile_size - multiple:
+            raise ValueError('overlap must be in [0, tile_size - {}].'.format(multiple))
+        margin = overlap // 4 if margin is None else margin
+        if not 0 <= 2 * margin <= overlap:
+            raise ValueError('margin must be in [0, overlap // 2].')
+        self.model = model
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.tiles_per_batch = max(1, tiles_per_batch)
+        self.multiple = multiple
+        self.margin = margin
+
+    def __call__(self, batch):
+        """Denoise an NxCxHxW float tensor in [0, 1].
+
+        Returns:
+            Tensor: Nx3xHxW denoised frames on the CPU, like model.fake_H.
+        """
+        n, _, h, w = batch.shape
+        padded = pad_to_multiple(batch, self.multiple)
+        padded_h, padded_w = padded.shape[-2:]
+        tile_h, tile_w = min(self.tile_size, padded_h), min(self.tile_size, padded_w)
+        positions = [(y, x) for y in tile_origins(padded_h, tile_h, self.overlap, self.multiple)
+                     for x in tile_origins(padded_w, tile_w, self.overlap, self.multiple)]
+
+        output = torch.zeros((n, 3, padded_h, padded_w))
+        weights = torch.zeros((1, padded_h, padded_w))
+        for start in range(0, len(positions), self.tiles_per_batch):
+            group = positions[start:start + self.tiles_per_batch]
+            tiles = torch.cat([padded[:, :, y:y + tile_h, x:x + tile_w] for y, x in group])
+            self.model.feed_test_data(tiles)
+            self.model.test()
+            denoised = self.model.fake_H.detach().float().cpu()
+            for i, (y, x) in enumerate(group):
+                window = blend_window(y, x, tile_h, tile_w, padded_h, padded_w, self.overlap, self.margin)
+                output[:, :, y:y + tile_h, x:x + tile_w] += denoised[i * n:(i + 1) * n] * window
+                weights[:, y:y + tile_h, x:x + tile_w] += window
+        output /= weights
+        return output[:, :, :h, :w]
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+from GammaCorrection import gamma_lut
+
+
+class ColourLUT:
+    def __init__(self, white_points, gamma=None, bit_depth=8):
+        """
+        Compile a per-channel colour transform for 8-bit images into one 3x256 lookup table
+        (or 16-bit images into a 3x65536 table).
+
+        The white balance part reproduces ImageProcessor.percentile_whitebalance exactly:
+        value v of channel c maps to round(255 * clip(v / white_points[c], 0, 1)), the same
+        float64 maths img_as_ubyte performs, evaluated once per table entry instead of once
+        per pixel. If gamma is given, the gamma lookup table is composed on top, so white
+        balance and gamma correction cost a single cv2.LUT pass.
+
+        Parameters:
+        - white_points: sequence of per-channel values that map to 255 (e.g. the white
+          balance percentiles), in the channel order of the images it will be applied to.
+        - gamma: float or None, gamma applied after the white balance.
+        - bit_depth: 8 for uint8 images or 16 for uint16 images, where 65535 takes the
+          place of 255 above.
+        """
+        if bit_depth not in (8, 16):
+            raise ValueError("ColourLUT supports 8-bit and 16-bit images.")
+        self.white_points = np.asarray(white_points, dtype=np.float64)
+        self.gamma = gamma
+        self.bit_depth = bit_depth
+        self.dtype = np.dtype(np.uint8 if bit_depth == 8 else np.uint16)
+        max_value = 2 ** bit_depth - 1
+
+        values = np.arange(max_value + 1, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scaled = values[None, :] * 1.0 / self.white_points[:, None]
+        # A zero white point sends every non-zero value to white and 0 stays black.
+        scaled = np.nan_to_num(scaled, nan=0.0, posinf=1.0).clip(0, 1)
+        table = np.rint(scaled * max_value).astype(self.dtype)
+
+        if gamma is not None:
+            table = gamma_lut(gamma, bit_depth)[table]
+
+        # Cx256 (or Cx65536) table, one row per channel.
+        self.table = table
+        # cv2.LUT wants a 1x256 table with one channel per image channel.
+        self._cv_table = np.ascontiguousarray(table.T.reshape(1, 256, -1)) if bit_depth == 8 else None
+
+    def apply(self, image, dst=None):
+        """
+        Apply the table to an HxWxC image (C = len(white_points)) of the table's dtype.
+
+        Pass dst (which may be image itself) to write into an existing buffer.
+        """
+        if image.dtype != self.dtype:
+            raise ValueError(f"This ColourLUT applies to {self.dtype} images, got {image.dtype}.")
+        if self.bit_depth == 8:
+            return cv2.LUT(image, self._cv_table, dst=dst)
+
+        # OpenCV has no 16-bit LUT: look each channel up in its own row with NumPy.
+        if dst is None:
+            dst = np.empty_like(image)
+        for channel, row in enumerate(self.table):
+            dst[:, :, channel] = row[image[:, :, channel]]
+        return dst
+
@@ -1,27 +1,264 @@
+import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from PIL import Image
 from scipy.signal import convolve2d
 
+# Supported colour filter array layouts, read row by row over the top-left 2x2 tile.
+CFA_PATTERNS = ("RGGB", "BGGR", "GRBG", "GBRG")
+
+# Kernels of the bilinear interpolation: 4-neighbour and diagonal averages.
+_K_CROSS = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]], dtype=np.float32) / 4
+_K_DIAG = np.array([[1, 0, 1], [0, 0, 0], [1, 0, 1]], dtype=np.float32) / 4
+
+
+# Interpolation engines of DemosaicProcessor.demosaic.
+DEMOSAIC_METHODS = ("bilinear", "malvar", "ahd")
+
+# Malvar-He-Cutler gradient-corrected kernels (scaled by 1/8).
+# Green at a red or blue site.
+_K_MHC_GREEN = np.array([[0, 0, -1, 0, 0],
+                         [0, 0, 2, 0, 0],
+                         [-1, 2, 4, 2, -1],
+                         [0, 0, 2, 0, 0],
+                         [0, 0, -1, 0, 0]], dtype=np.float32) / 8
+# Red/blue at a green site whose horizontal neighbours carry that colour.
+_K_MHC_ROW = np.array([[0, 0, 0.5, 0, 0],
+                       [0, -1, 0, -1, 0],
+                       [-1, 4, 5, 4, -1],
+                       [0, -1, 0, -1, 0],
+                       [0, 0, 0.5, 0, 0]], dtype=np.float32) / 8
+# Red/blue at a green site whose vertical neighbours carry that colour.
+_K_MHC_COLUMN = np.ascontiguousarray(_K_MHC_ROW.T)
+# Red at a blue site and blue at a red site.
+_K_MHC_DIAG = np.array([[0, 0, -1.5, 0, 0],
+                        [0, 2, 0, 2, 0],
+                        [-1.5, 0, 6, 0, -1.5],
+                        [0, 2, 0, 2, 0],
+                        [0, 0, -1.5, 0, 0]], dtype=np.float32) / 8
+
+# Hamilton-Adams green estimates along a row and along a column, used by AHD.
+_K_AHD_ROW = np.array([[-0.25, 0.5, 0.5, 0.5, -0.25]], dtype=np.float32)
+_K_AHD_COLUMN = np.ascontiguousarray(_K_AHD_ROW.T)
+
+# (row, column) offsets of the four sites of a CFA tile, in CFA_PATTERNS order.
+_CFA_SITES = ((0, 0), (0, 1), (1, 0), (1, 1))
+
+
+def _filter_zero(plane, kernel):
+    """3x3 'same' convolution with zero padding, like convolve2d(plane, kernel, 'same')."""
+    return cv2.filter2D(plane, -1, kernel, borderType=cv2.BORDER_CONSTANT)
+
+
+def _filter(plane, kernel):
+    """'same' convolution with mirrored borders; reflect-101 keeps the CFA phase at the edges."""
+    return cv2.filter2D(plane, -1, kernel, borderType=cv2.BORDER_REFLECT_101)
+
+
+def mosaic(rgb, pattern="RGGB"):
+    """
+    Sample an HxWx3 RGB image through a Bayer colour filter array.
+
+    Returns:
+    - np.ndarray of shape (H, W) with the image's dtype, as a sensor would record it.
+    """
+    pattern = pattern.upper()
+    if pattern not in CFA_PATTERNS:
+        raise ValueError(f"Unknown CFA pattern: {pattern}")
+    raw = np.empty(rgb.shape[:2], dtype=rgb.dtype)
+    for (dy, dx), colour in zip(_CFA_SITES, pattern):
+        raw[dy::2, dx::2] = rgb[dy::2, dx::2, "RGB".index(colour)]
+    return raw
+
+
+def _demosaic_malvar(raw, pattern):
+    """Malvar-He-Cutler gradient-corrected linear interpolation of a float32 mosaic."""
+    green = _filter(raw, _K_MHC_GREEN)
+    row = _filter(raw, _K_MHC_ROW)
+    column = _filter(raw, _K_MHC_COLUMN)
+    diagonal = _filter(raw, _K_MHC_DIAG)
+
+    rgb = np.empty(raw.shape + (3,), dtype=np.float32)
+    for (dy, dx), colour in zip(_CFA_SITES, pattern):
+        site = (slice(dy, None, 2), slice(dx, None, 2))
+        if colour == "G":
+            # The colours of the horizontal and vertical neighbours of this green site.
+            row_colour = pattern[2 * dy + (1 - dx)]
+            column_colour = pattern[2 * (1 - dy) + dx]
+            rgb[site + ("RGB".index(row_colour),)] = row[site]
+            rgb[site + ("RGB".index(column_colour),)] = column[site]
+            rgb[site + (1,)] = raw[site]
+        else:
+            other = "B" if colour == "R" else "R"
+            rgb[site + ("RGB".index(colour),)] = raw[site]
+            rgb[site + (1,)] = green[site]
+            rgb[site + ("RGB".index(other),)] = diagonal[site]
+    return rgb
+
+
+def _ahd_candidate(raw, pattern, green_kernel):
+    """Full RGB estimate of a mosaic with green interpolated along one direction only."""
+    green = raw.copy()
+    estimate = _filter(raw, green_kernel)
+    for (dy, dx), colour in zip(_CFA_SITES, pattern):
+        if colour != "G":
+            green[dy::2, dx::2] = estimate[dy::2, dx::2]
+
+    planes = {"G": green}
+    for colour in "RB":
+        # Interpolate the colour difference, which is smooth across edges, then add green back.
+        difference = np.zeros_like(raw)
+        for (dy, dx), site_colour in zip(_CFA_SITES, pattern):
+            if site_colour == colour:
+                difference[dy::2, dx::2] = raw[dy::2, dx::2] - green[dy::2, dx::2]
+        difference += _filter(difference, _K_DIAG)
+        difference += _filter(difference, _K_CROSS)
+        planes[colour] = difference + green
+    return cv2.merge((planes["R"], planes["G"], planes["B"]))
+
+
+class _LabNeighbours:
+    """CIELab planes of an image, padded once so neighbour distances are cheap views."""
+
+    def __init__(self, lab):
+        self.height, self.width = lab.shape[:2]
+        self.planes = cv2.split(cv2.copyMakeBorder(lab, 1, 1, 1, 1, cv2.BORDER_REPLICATE))
+
+    def distances(self, dy, dx):
+        """Luminance and squared chroma distance of every pixel to its neighbour at (dy, dx)."""
+        centre = (slice(1, 1 + self.height), slice(1, 1 + self.width))
+        neighbour = (slice(1 + dy, 1 + dy + self.height), slice(1 + dx, 1 + dx + self.width))
+        luminance, a, b = self.planes
+        luminance_distance = cv2.absdiff(luminance[centre], luminance[neighbour])
+        da = cv2.subtract(a[centre], a[neighbour])
+        db = cv2.subtract(b[centre], b[neighbour])
+        chroma_distance = cv2.add(cv2.multiply(da, da), cv2.multiply(db, db))
+        return luminance_distance, chroma_distance
+
+
+def _demosaic_ahd(raw, pattern, white_level):
+    """
+    Adaptive homogeneity-directed demosaic (Hirakawa-Parks) of a float32 mosaic.
+
+    Builds one estimate interpolated along rows and one along columns, measures how
+    many of each pixel's 4 neighbours stay within an adaptive CIELab distance in each
+    estimate, and keeps, per pixel, the estimate that is more homogeneous over a 3x3
+    window (their mean on ties).
+    """
+    candidates = (_ahd_candidate(raw, pattern, _K_AHD_ROW), _ahd_candidate(raw, pattern, _K_AHD_COLUMN))
+    scale = np.float32(1.0 / max(float(white_level), 1e-12))
+    labs = [_LabNeighbours(cv2.cvtColor(np.clip(candidate * scale, 0, 1), cv2.COLOR_RGB2Lab))
+            for candidate in candidates]
+
+    # Thresholds: the largest step across the interpolation direction of each estimate.
+    row_luminance, row_chroma = zip(*(labs[0].distances(0, dx) for dx in (-1, 1)))
+    column_luminance, column_chroma = zip(*(labs[1].distances(dy, 0) for dy in (-1, 1)))
+    epsilon_luminance = np.minimum(np.maximum(*row_luminance), np.maximum(*column_luminance))
+    epsilon_chroma = np.minimum(np.maximum(*row_chroma), np.maximum(*column_chroma))
+    del row_luminance, row_chroma, column_luminance, column_chroma
+
+    homogeneity = []
+    for lab in labs:
+        count = np.zeros(raw.shape, dtype=np.uint8)
+        for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            luminance, chroma = lab.distances(dy, dx)
+            count += (luminance <= epsilon_luminance) & (chroma <= epsilon_chroma)
+        # At most 9 * 4 = 36, so the 3x3 sum fits in uint8.
+        homogeneity.append(cv2.boxFilter(count, -1, (3, 3), normalize=False,
+                                         borderType=cv2.BORDER_REPLICATE))
+
+    row_estimate, column_estimate = candidates
+    rgb = cv2.addWeighted(row_estimate, 0.5, column_estimate, 0.5, 0)
+    cv2.copyTo(row_estimate, (homogeneity[0] > homogeneity[1]).view(np.uint8), rgb)
+    cv2.copyTo(column_estimate, (homogeneity[1] > homogeneity[0]).view(np.uint8), rgb)
+    return rgb
+
+
 class DemosaicProcessor:
     def __init__(self, image_path):
         self.image_path = image_path
         self.raw_image = None
 
-    def load_image(self):
-        """Load a grayscale (raw Bayer) image from the given path."""
-        self.raw_image = np.array(Image.open(self.image_path).convert('L'))
-
-    # Color filtering: `rggb`
-    def bayer(self, im):
-        r = np.zeros(im.shape[:2])
-        g = np.zeros(im.shape[:2])
-        b = np.zeros(im.shape[:2])
-        r[0::2, 0::2] += im[0::2, 0::2]
-        g[0::2, 1::2] += im[0::2, 1::2]
-        g[1::2, 0::2] += im[1::2, 0::2]
-        b[1::2, 1::2] += im[1::2, 1::2]
-        return r, g, b
+    def load_image(self, keep_bit_depth=False):
+        """
+        Load a grayscale (raw Bayer) image from the given path.
+
+        With keep_bit_depth=True, 10/12/16-bit mosaics stored in 16-bit files keep their
+        full precision instead of being reduced to 8 bits by PIL's convert('L').
+        """
+        if not keep_bit_depth:
+            self.raw_image = np.array(Image.open(self.image_path).convert('L'))
+            return
+
+        image = cv2.imread(self.image_path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise FileNotFoundError(f"Could not read image: {self.image_path}")
+        if image.ndim == 3:
+            image = cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+        self.raw_image = image
+
+    # Color filtering: `rggb` by default
+    def bayer(self, im, pattern="RGGB", dtype=np.float64):
+        """Split a mosaic into sparse R, G, B planes (zeros where a colour was not sampled)."""
+        pattern = pattern.upper()
+        if pattern not in CFA_PATTERNS:
+            raise ValueError(f"Unknown CFA pattern: {pattern}")
+        planes = {colour: np.zeros(im.shape[:2], dtype=dtype) for colour in "RGB"}
+        for (dy, dx), colour in zip(((0, 0), (0, 1), (1, 0), (1, 1)), pattern):
+            planes[colour][dy::2, dx::2] = im[dy::2, dx::2]
+        return planes["R"], planes["G"], planes["B"]
+
+    def demosaic(self, pattern="RGGB", white_level=None, out_dtype=np.uint8, method="bilinear"):
+        """
+        Fast demosaic of 8/10/12/16-bit Bayer data.
+
+        The 'bilinear' method produces the same interpolation as bilinear() (including its
+        zero-padded borders) for any of the CFA_PATTERNS, but works in float32 with
+        OpenCV's filter2D. 'malvar' adds Malvar-He-Cutler gradient correction through
+        four 5x5 kernels and 'ahd' picks between row- and column-wise interpolation per
+        pixel (adaptive homogeneity-directed); both remove most of bilinear's zipper
+        artifacts. Every method returns one normalized, interleaved HxWx3 RGB image.
+
+        Parameters:
+        - pattern: str, CFA layout of the mosaic (one of CFA_PATTERNS).
+        - white_level: number mapped to full scale; defaults to the mosaic maximum like
+          bilinear(). Pass the sensor white level (e.g. 4095 for 12-bit) for consistent
+          exposure across frames.
+        - out_dtype: np.uint8 or np.uint16 (scaled to the type's maximum and truncated,
+          as in bilinear()), or np.float32 for values in [0, 1].
+        - method: str, one of DEMOSAIC_METHODS.
+
+        Returns:
+        - np.ndarray of shape (H, W, 3).
+        """
+        pattern = pattern.upper()
+        if pattern not in CFA_PATTERNS:
+            raise ValueError(f"Unknown CFA pattern: {pattern}")
+        if method not in DEMOSAIC_METHODS:
+            raise ValueError(f"Unknown demosaic method: {method}")
+        if white_level is None:
+            white_level = np.max(self.raw_image)
+
+        if method == "bilinear":
+            r, g, b = self.bayer(self.raw_image, pattern, dtype=np.float32)
+
+            # Green: add the 4-neighbour average at red and blue sites
+            g += _filter_zero(g, _K_CROSS)
+
+            # Red and blue: diagonal average first, then the 4-neighbour average of the result
+            for plane in (r, b):
+                plane += _filter_zero(plane, _K_DIAG)
+                plane += _filter_zero(plane, _K_CROSS)
+            rgb = cv2.merge((r, g, b))
+        elif method == "malvar":
+            rgb = _demosaic_malvar(self.raw_image.astype(np.float32), pattern)
+        else:
+            rgb = _demosaic_ahd(self.raw_image.astype(np.float32), pattern, white_level)
+
+        out_dtype = np.dtype(out_dtype)
+        full_scale = 1.0 if out_dtype.kind == "f" else float(np.iinfo(out_dtype).max)
+        rgb *= np.float32(full_scale / max(float(white_level), 1e-12))
+        np.clip(rgb, 0, full_scale, out=rgb)
+        return rgb.astype(out_dtype)
 
     def bilinear(self):
         r, g, b = self.bayer(self.raw_image)  # Use self.bayer here
@@ -60,6 +297,9 @@ class DemosaicProcessor:
 
     def display_image(self, r, g, b):
         """Display the demosaiced image using matplotlib."""
+        # Imported here so pipelines that only demosaic never load pyplot.
+        import matplotlib.pyplot as plt
+
         # Stack the r, g, b channels into a 3D array
         demosaiced_image = np.dstack((r, g, b)).astype(np.uint8)
         # print(demosaiced_image)
@@ -0,0 +1,91 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from demosaic import CFA_PATTERNS, DEMOSAIC_METHODS, DemosaicProcessor, mosaic
+
+RESOLUTIONS = {
+    "vga": (480, 640),
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+    "12mp": (3000, 4000),
+}
+
+# Pixels ignored along each edge when scoring, so bilinear's zero-padded border does not dominate.
+PSNR_BORDER = 4
+
+
+def make_test_chart(height, width):
+    """Create a synthetic RGB reference: colour ramps, hard-edged patches and a zone plate."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    chart = np.empty((height, width, 3), dtype=np.float32)
+    chart[:, :, 0] = 40 + 160 * x / width
+    chart[:, :, 1] = 40 + 160 * y / height
+    chart[:, :, 2] = 120
+
+    # Saturated patches with sharp colour edges, where bilinear zippers the most.
+    patch = max(height, width) // 16
+    colours = np.array([[220, 30, 30], [30, 200, 40], [40, 60, 220], [230, 220, 40]], dtype=np.float32)
+    for index, (top, left) in enumerate(((patch, patch), (patch, 3 * patch), (3 * patch, patch), (3 * patch, 3 * patch))):
+        chart[top:top + 2 * patch, left:left + 2 * patch] = colours[index]
+
+    # Zone plate in the lower right quarter: fine detail of every orientation.
+    cy, cx = 3 * height / 4, 3 * width / 4
+    radius = min(height, width) / 4
+    r2 = (y - cy) ** 2 + (x - cx) ** 2
+    zone = r2 < radius ** 2
+    chart[zone] = (128 + 100 * np.cos(np.pi * r2[zone] / (2 * radius)))[:, None]
+    return np.clip(chart, 0, 255).astype(np.uint8)
+
+
+def psnr(reference, image, border=PSNR_BORDER):
+    """Peak signal-to-noise ratio (dB) of an 8-bit image against its reference."""
+    crop = (slice(border, -border), slice(border, -border))
+    error = reference[crop].astype(np.float64) - image[crop].astype(np.float64)
+    mse = np.mean(np.square(error))
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def time_method(processor, pattern, method, repeat):
+    """Return the best wall time (seconds) and the output of demosaic over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = processor.demosaic(pattern, white_level=255, method=method)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the demosaic engines in demosaic.py.")
+    parser.add_argument("-resolution", choices=sorted(RESOLUTIONS), default="1080p")
+    parser.add_argument("-image", help="RGB reference image to mosaic instead of the synthetic chart.")
+    parser.add_argument("-pattern", choices=CFA_PATTERNS, default="RGGB")
+    parser.add_argument("-methods", nargs="+", choices=DEMOSAIC_METHODS, default=list(DEMOSAIC_METHODS))
+    parser.add_argument("-repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image:
+        reference = cv2.imread(args.image, cv2.IMREAD_COLOR)
+        if reference is None:
+            parser.error(f"Could not read image: {args.image}")
+        reference = cv2.cvtColor(reference, cv2.COLOR_BGR2RGB)
+        source = args.image
+    else:
+        reference = make_test_chart(*RESOLUTIONS[args.resolution])
+        source = f"synthetic chart at {args.resolution}"
+
+    height, width = reference.shape[:2]
+    processor = DemosaicProcessor(None)
+    processor.raw_image = mosaic(reference, args.pattern)
+    megapixels = height * width / 1e6
+    print(f"Demosaic benchmark on {source} ({width}x{height}, {args.pattern})")
+    print(f"{'method':>10} {'ms/frame':>10} {'MP/s':>8} {'PSNR dB':>8}")
+
+    for method in args.methods:
+        seconds, output = time_method(processor, args.pattern, method, args.repeat)
+        print(f"{method:>10} {seconds * 1000:>10.1f} {megapixels / seconds:>8.2f} {psnr(reference, output):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
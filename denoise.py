@@ -1,5 +1,119 @@
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from PIL import Image
 
+# Median methods understood by median_filter(); "auto" picks one per call.
+MEDIAN_METHODS = ("auto", "sort", "opencv", "histogram")
+
+# cv2.medianBlur accepts these depths for 3x3 and 5x5 windows, and only uint8 above.
+_OPENCV_MEDIAN_DTYPES = (np.uint8, np.uint16, np.float32)
+
+
+def _median_sort(channel, offset, rows_per_chunk=None):
+    """Median of every (2*offset+1)^2 window of a 2D array via partial selection."""
+    size = 2 * offset + 1
+    kth = (size * size) // 2
+    height, width = channel.shape
+    padded = np.pad(channel, offset, mode="edge")
+    windows = sliding_window_view(padded, (size, size))
+    out = np.empty_like(channel)
+
+    # Partitioning needs a contiguous copy of the windows, so bound its size
+    # to roughly 64 MB regardless of the frame or window size.
+    if rows_per_chunk is None:
+        rows_per_chunk = max(1, (64 << 20) // max(1, width * size * size * channel.itemsize))
+    for top in range(0, height, rows_per_chunk):
+        block = windows[top:top + rows_per_chunk].reshape(-1, width, size * size)
+        out[top:top + rows_per_chunk] = np.partition(block, kth, axis=-1)[..., kth]
+    return out
+
+
+def _median_histogram(channel, offset):
+    """
+    Median of every (2*offset+1)^2 window of a 2D uint8 array via column histograms.
+
+    Perreault-Hebert style: one 256-bin histogram per padded column is slid down
+    the image (one removal and one insertion per column and row), the kernel
+    histograms are running sums of 2*offset+1 neighbouring columns, and the
+    median is the first bin whose cumulative count passes half the window.
+    The per-pixel work does not grow with the radius, but the row loop runs in
+    Python, so it is far slower than cv2.medianBlur (see medianBenchmark.py);
+    it is only used when asked for explicitly.
+    """
+    size = 2 * offset + 1
+    kth = (size * size) // 2
+    height, width = channel.shape
+    padded = np.pad(channel, offset, mode="edge")
+    columns = np.arange(padded.shape[1])
+
+    col_hist = np.zeros((padded.shape[1], 256), dtype=np.uint16)
+    for row in padded[:size]:
+        col_hist[columns, row] += 1
+
+    out = np.empty_like(channel)
+    for y in range(height):
+        if y:
+            col_hist[columns, padded[y - 1]] -= 1
+            col_hist[columns, padded[y + size - 1]] += 1
+        # Unnormalised box filter along the columns = running window sum.
+        kernel = cv2.boxFilter(col_hist, -1, (1, size), normalize=False,
+                               borderType=cv2.BORDER_CONSTANT)[offset:offset + width]
+        np.cumsum(kernel, axis=1, dtype=np.uint16, out=kernel)
+        out[y] = np.count_nonzero(kernel <= kth, axis=1)
+    return out
+
+
+def median_filter(array, region_size=3, method="auto"):
+    """
+    Median-filter an HxW or HxWxC array with edge-replicated borders.
+
+    The window is (2 * (region_size // 2) + 1) pixels square, exactly like
+    ImageDenoiser.apply_median_filter, and the result is bit-identical to it.
+
+    Parameters:
+    - array: np.ndarray, image data (each channel is filtered independently).
+    - region_size: int, the same region size accepted by denoise_rgb.
+    - method: str, one of MEDIAN_METHODS. "opencv" uses cv2.medianBlur, which
+      replicates borders and runs a SIMD sorting network for 3x3/5x5 windows;
+      "sort" uses sliding-window views plus np.partition and works for any dtype;
+      "histogram" (uint8 only, explicit use only) is a constant-time-per-pixel
+      reference implementation, much slower than "opencv" in practice.
+      "auto" uses "opencv" for uint8 at every window size and for uint16/float32
+      up to 5x5, and "sort" otherwise.
+    """
+    if method not in MEDIAN_METHODS:
+        raise ValueError(f"Unknown median method: {method}")
+
+    offset = region_size // 2
+    if offset == 0:
+        return array.copy()
+    size = 2 * offset + 1
+
+    if method == "auto":
+        if array.dtype == np.uint8 or (size <= 5 and array.dtype in _OPENCV_MEDIAN_DTYPES):
+            method = "opencv"
+        else:
+            method = "sort"
+
+    if method == "opencv":
+        if array.ndim == 3 and array.shape[2] not in (1, 3, 4):
+            return np.dstack([cv2.medianBlur(np.ascontiguousarray(array[:, :, c]), size)
+                              for c in range(array.shape[2])])
+        return cv2.medianBlur(np.ascontiguousarray(array), size)
+
+    if method == "histogram":
+        if array.dtype != np.uint8:
+            raise ValueError("The histogram median only supports uint8 data.")
+        filter_channel = _median_histogram
+    else:
+        filter_channel = _median_sort
+
+    if array.ndim == 2:
+        return filter_channel(array, offset)
+    return np.dstack([filter_channel(array[:, :, c], offset) for c in range(array.shape[2])])
+
+
 class ImageDenoiser:
     def __init__(self, img_path):
         """Initialize the denoiser with an image path."""
@@ -49,8 +163,21 @@ class ImageDenoiser:
 
         return imgdup
 
-    def denoise_rgb(self, region_size=5):
-        """Applies the median filter to each RGB channel with a specified region size."""
+    def denoise_array(self, array, region_size=5, method="auto"):
+        """Applies the array-backed median filter to an HxWxC frame buffer."""
+        return median_filter(array, region_size, method)
+
+    def denoise_rgb(self, region_size=5, method="auto"):
+        """
+        Applies the median filter to each RGB channel with a specified region size.
+
+        method selects the median engine (see median_filter); "python" keeps the
+        original per-pixel implementation.
+        """
+        if method != "python":
+            denoised = self.denoise_array(np.asarray(self.img), region_size, method)
+            return Image.fromarray(denoised, "RGB")
+
         # Split the image into its R, G, B channels
         r, g, b = self.img.split()
 
@@ -0,0 +1,52 @@
+import argparse
+import numpy as np
+from benchmarkUtils import RESOLUTIONS, time_call
+from denoise import median_filter
+
+
+def make_noisy_frame(height, width, seed=0):
+    """Create a synthetic low-light frame: smooth gradient plus salt-and-pepper noise."""
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(20, 90, width, dtype=np.float32)[None, :, None]
+    frame = np.repeat(np.repeat(ramp, height, axis=0), 3, axis=2)
+    frame += rng.normal(0, 12, frame.shape).astype(np.float32)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    speckles = rng.random(frame.shape[:2]) < 0.02
+    frame[speckles] = 255
+    return frame
+
+
+def time_method(frame, region_size, method, repeat):
+    """Return the best wall time (seconds) of median_filter over `repeat` runs."""
+    return time_call(lambda: median_filter(frame, region_size, method), repeat)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the median filter engines in denoise.py.")
+    parser.add_argument("-resolution", choices=sorted(RESOLUTIONS), default="720p")
+    parser.add_argument("-sizes", type=int, nargs="+", default=[3, 5, 7, 9, 11, 15],
+                        help="Odd window sizes to benchmark.")
+    parser.add_argument("-repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    height, width = RESOLUTIONS[args.resolution]
+    frame = make_noisy_frame(height, width)
+    megapixels = height * width / 1e6
+    print(f"Median benchmark at {args.resolution} ({width}x{height}, RGB uint8)")
+    print(f"{'window':>8} {'method':>10} {'ms/frame':>10} {'MP/s':>8}")
+
+    for size in args.sizes:
+        if size % 2 == 0:
+            parser.error(f"Window sizes must be odd, got {size}.")
+        # cv2.medianBlur handles every odd window for uint8 and is the fastest engine at
+        # every size, so "auto" uses it; the histogram median is constant-time per pixel
+        # but loops over rows in Python and is listed for comparison only.
+        reference = median_filter(frame, size, "sort")
+        for method in ("sort", "histogram", "opencv", "auto"):
+            assert np.array_equal(median_filter(frame, size, method), reference)
+            seconds = time_method(frame, size, method, args.repeat)
+            print(f"{size:>6}x{size:<1} {method:>10} {seconds * 1000:>10.1f} {megapixels / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
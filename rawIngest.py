@@ -0,0 +1,128 @@
+import os
+import cv2
+import numpy as np
+from demosaic import CFA_PATTERNS, DemosaicProcessor
+
+# Camera RAW containers decoded through rawpy (LibRaw); only Bayer sensors are supported.
+RAW_EXTENSIONS = ('.arw', '.cr2', '.cr3', '.dng', '.nef', '.orf', '.raf', '.rw2')
+
+# Headerless Bayer dumps (sensor frames written straight to disk), read with np.memmap.
+BAYER_DUMP_EXTENSIONS = ('.raw', '.bayer', '.bin')
+
+
+def is_raw_file(path):
+    """True if path names a RAW container or a headerless Bayer dump."""
+    return path.lower().endswith(RAW_EXTENSIONS + BAYER_DUMP_EXTENSIONS)
+
+
+class RawIngestor:
+    def __init__(self, pattern="RGGB", width=None, height=None, bit_depth=16, offset=0, black_level=0,
+                 demosaic_method="bilinear", tile_executor=None):
+        """
+        Read Bayer mosaics and hand them to DemosaicProcessor at 16-bit precision.
+
+        RAW containers (RAW_EXTENSIONS) are decoded by rawpy, which also supplies the CFA
+        pattern, black and white levels. Headerless dumps (BAYER_DUMP_EXTENSIONS) are
+        memory-mapped, so only the frame being demosaiced is read from disk; their layout
+        comes from the parameters below.
+
+        Parameters:
+        - pattern: str, CFA layout of dump frames (one of CFA_PATTERNS).
+        - width, height: int, dump frame size in pixels.
+        - bit_depth: int, significant bits per dump sample (8, or 10/12/14/16 stored
+          little-endian in 16-bit words); sets the white level.
+        - offset: int, bytes to skip at the start of a dump file.
+        - black_level: int, sensor black level subtracted from dump samples.
+        - demosaic_method: str, DemosaicProcessor.demosaic method.
+        - tile_executor: TileExecutor demosaicing tile-parallel (same output); None
+          demosaics the whole frame at once.
+        """
+        if pattern.upper() not in CFA_PATTERNS:
+            raise ValueError(f"Unknown CFA pattern: {pattern}")
+        self.pattern = pattern.upper()
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.offset = offset
+        self.black_level = black_level
+        self.demosaic_method = demosaic_method
+        self.tile_executor = tile_executor
+
+    def map_frames(self, path):
+        """
+        Memory-map every frame of a headerless Bayer dump.
+
+        Returns:
+        - np.memmap of shape (frames, height, width), read-only.
+        """
+        if self.width is None or self.height is None:
+            raise ValueError("Reading a Bayer dump needs its width and height.")
+        dtype = np.dtype(np.uint8 if self.bit_depth <= 8 else '<u2')
+        frame_bytes = self.width * self.height * dtype.itemsize
+        frames = (os.path.getsize(path) - self.offset) // frame_bytes
+        if frames < 1:
+            raise ValueError(f"{path} is smaller than one {self.width}x{self.height} frame.")
+        return np.memmap(path, dtype=dtype, mode='r', offset=self.offset,
+                         shape=(frames, self.height, self.width))
+
+    def read_mosaic(self, path, frame_index=0):
+        """
+        Read one Bayer mosaic, black level removed.
+
+        Returns:
+        - mosaic: np.ndarray (H, W) of uint16 (or uint8 for 8-bit dumps).
+        - pattern: str, its CFA layout.
+        - white_level: int, the sample value of a saturated pixel after black level removal.
+        """
+        if path.lower().endswith(RAW_EXTENSIONS):
+            # rawpy is only needed for camera containers.
+            import rawpy
+            with rawpy.imread(path) as raw:
+                mosaic = raw.raw_image_visible.astype(np.uint16)
+                colours = raw.color_desc.decode()
+                site_colours = raw.raw_pattern
+                # Only 2x2 Bayer layouts demosaic here; X-Trans (6x6, e.g. most .raf files)
+                # or four-colour sensors would silently come out as a wrong Bayer layout.
+                if site_colours is None or site_colours.shape != (2, 2):
+                    shape = "no" if site_colours is None else "x".join(str(n) for n in site_colours.shape)
+                    raise ValueError(f"{path}: {shape} CFA pattern, only 2x2 Bayer mosaics are supported.")
+                pattern = "".join(colours[index] for index in site_colours.ravel())
+                if pattern not in CFA_PATTERNS:
+                    raise ValueError(f"{path}: unsupported CFA pattern {pattern}.")
+                black = np.array(raw.black_level_per_channel)[site_colours]
+                white_level = int(raw.white_level)
+            # Subtract the per-site black level in place, clipping at zero.
+            for dy in range(2):
+                for dx in range(2):
+                    site = mosaic[dy::2, dx::2]
+                    np.subtract(site, np.minimum(site, int(black[dy, dx])), out=site)
+            return mosaic, pattern, white_level - int(black.max())
+
+        return self._dump_mosaic(self.map_frames(path)[frame_index])
+
+    def _dump_mosaic(self, frame):
+        """Black level removal for one memory-mapped dump frame (this reads it from disk)."""
+        frame = np.asarray(frame)
+        if self.black_level:
+            frame = np.subtract(frame, np.minimum(frame, self.black_level))
+        return frame, self.pattern, 2 ** self.bit_depth - 1 - self.black_level
+
+    def demosaic(self, mosaic, pattern, white_level):
+        """Demosaic a mosaic to an HxWx3 uint16 BGR frame ready for FramePipeline."""
+        if self.tile_executor is not None:
+            rgb = self.tile_executor.demosaic(mosaic, pattern, white_level, np.uint16, self.demosaic_method)
+        else:
+            processor = DemosaicProcessor(None)
+            processor.raw_image = mosaic
+            rgb = processor.demosaic(pattern, white_level=white_level, out_dtype=np.uint16,
+                                     method=self.demosaic_method)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=rgb)
+
+    def load(self, path, frame_index=0):
+        """Read and demosaic one frame: returns an HxWx3 uint16 BGR image, no 8-bit file in between."""
+        return self.demosaic(*self.read_mosaic(path, frame_index))
+
+    def frames(self, path):
+        """Yield every frame of a headerless Bayer dump as an HxWx3 uint16 BGR image."""
+        for frame in self.map_frames(path):
+            yield self.demosaic(*self._dump_mosaic(frame))
@@ -0,0 +1,158 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+import cv2
+import numpy as np
+from benchmarkUtils import peak_rss_mb
+from demosaic import mosaic
+from medianBenchmark import RESOLUTIONS, make_noisy_frame, time_call
+from stageGraph import Stage
+from traditionalEncap import FramePipeline, TraditionalProcessor
+
+# Stages timed on their own, with the settings TraditionalProcessor uses by default.
+STAGES = {
+    "whitebalance": dict(percentile_value=99.9),
+    "demosaic": dict(method="bilinear"),
+    "sharpen": dict(scale=2.5),
+    "denoise": dict(region_size=4),
+    "gamma": dict(gamma=1.13),
+}
+
+
+def git_commit():
+    """Commit the benchmark runs on (with '-dirty' for local changes), or None outside a git checkout."""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=folder, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=folder,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def result_entry(name, megapixels, best, mean, baseline_rss):
+    """
+    One row of the report. Each row is measured in its own process (see measure_stage), so
+    peak_rss_mb is this stage's peak and peak_rss_delta_mb what it added to the input frame.
+    """
+    peak = peak_rss_mb()
+    return {
+        "name": name,
+        "ms_per_frame": best * 1000,
+        "mean_ms_per_frame": mean * 1000,
+        "megapixels_per_second": megapixels / best,
+        "peak_rss_mb": peak,
+        "peak_rss_delta_mb": None if peak is None else peak - baseline_rss,
+    }
+
+
+def measure_stage(name, resolution, repeat, work_folder):
+    """Time one stage (or the "traditional_processor" chain) on the resolution's frame in work_folder."""
+    # Load the frame benchmark_resolution saved: generating or decoding it here would leave
+    # temporaries that set the peak before any stage runs, while np.load reads it in place.
+    frame = np.load(os.path.join(work_folder, f"{resolution}.npy"))
+    megapixels = frame.shape[0] * frame.shape[1] / 1e6
+
+    if name in STAGES:
+        stage = Stage(name, **STAGES[name])
+        # The demosaic stage reads a Bayer mosaic of the frame, the others the frame itself.
+        stage_input = mosaic(frame) if name == "demosaic" else frame
+        baseline_rss = peak_rss_mb()
+        stage.run(stage_input)  # warm-up: lookup tables, thread pools, page faults
+        return result_entry(name, megapixels, *time_call(lambda: stage.run(stage_input), repeat), baseline_rss)
+
+    # Full chain as deployed: load the image, run every stage, write the outputs.
+    input_path = os.path.join(work_folder, f"{resolution}.png")
+    cv2.imwrite(input_path, frame)
+    pipeline = FramePipeline()
+
+    def run_chain():
+        processor = TraditionalProcessor(input_path, work_folder, pipeline=pipeline)
+        # Keep the per-image progress messages out of the table.
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = processor.process_image()
+        if not ok:
+            raise processor.error
+    baseline_rss = peak_rss_mb()
+    run_chain()
+    return result_entry(name, megapixels, *time_call(run_chain, repeat), baseline_rss)
+
+
+def benchmark_resolution(resolution, repeat, work_folder):
+    """
+    Time every stage and the whole TraditionalProcessor chain on one synthetic frame.
+
+    ru_maxrss only ever grows within a process, so every row runs in a fresh one.
+    """
+    height, width = RESOLUTIONS[resolution]
+    np.save(os.path.join(work_folder, f"{resolution}.npy"), make_noisy_frame(height, width))
+    results = []
+    for name in list(STAGES) + ["traditional_processor"]:
+        command = [sys.executable, os.path.abspath(__file__), "-measure", name, "-resolutions", resolution,
+                   "-repeat", str(repeat), "-work_folder", work_folder]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output))
+    return {"resolution": resolution, "width": width, "height": height, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the traditional stages on synthetic noisy frames.")
+    parser.add_argument("-resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("-repeat", type=int, default=5)
+    parser.add_argument("-output", help="JSON file for the results, e.g. benchmark_<commit>.json.")
+    # Internal: measure one stage in this process and print its row as JSON.
+    parser.add_argument("-measure", choices=list(STAGES) + ["traditional_processor"], help=argparse.SUPPRESS)
+    parser.add_argument("-work_folder", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_stage(args.measure, args.resolutions[0], args.repeat, args.work_folder)))
+        return
+    if not args.output:
+        parser.error("-output is required (the results are not written into the working directory by default).")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "opencv_threads": cv2.getNumThreads(),
+        },
+        "repeat": args.repeat,
+        "resolutions": [],
+    }
+
+    print(f"Stage benchmark at commit {commit or 'unknown'} (best of {args.repeat})")
+    print(f"{'resolution':>10} {'stage':>22} {'ms/frame':>10} {'MP/s':>8} {'peak RSS MB':>12} {'+RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as work_folder:
+        for resolution in args.resolutions:
+            entry = benchmark_resolution(resolution, args.repeat, work_folder)
+            report["resolutions"].append(entry)
+            for result in entry["results"]:
+                rss = "-" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.0f}"
+                delta = "-" if result["peak_rss_delta_mb"] is None else f"{result['peak_rss_delta_mb']:.0f}"
+                print(f"{resolution:>10} {result['name']:>22} {result['ms_per_frame']:>10.1f} "
+                      f"{result['megapixels_per_second']:>8.2f} {rss:>12} {delta:>8}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
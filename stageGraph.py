@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from whiteBalance import ImageProcessor
+from demosaic import DemosaicProcessor
+from sharpen import laplacian_sharpen
+from denoise import ImageDenoiser
+from GammaCorrection import GammaCorrection, apply_gamma
+from tiling import TileExecutor
+
+
+def _whitebalance_stage(percentile_value=99.9, tiles=None):
+    """Percentile white balance (ImageProcessor.percentile_whitebalance)."""
+    processor = ImageProcessor()
+    return lambda frame: processor.percentile_whitebalance(frame, percentile_value)[0]
+
+
+def _demosaic_stage(pattern="RGGB", method="bilinear", white_level=None, bit_depth=8, tiles=None):
+    """DemosaicProcessor.demosaic of an HxW mosaic into an HxWx3 BGR frame of bit_depth bits."""
+    out_dtype = np.uint8 if bit_depth == 8 else np.uint16
+
+    def run(mosaic):
+        if tiles is not None:
+            rgb = tiles.demosaic(mosaic, pattern, white_level, out_dtype, method)
+        else:
+            processor = DemosaicProcessor(None)
+            processor.raw_image = mosaic
+            rgb = processor.demosaic(pattern, white_level, out_dtype, method)
+        # The other stages work on OpenCV's BGR order.
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=rgb)
+    return run
+
+
+def _sharpen_stage(scale=2.5, tiles=None):
+    """Laplacian sharpening (the array path of ImageSharpener.sharpen)."""
+    if tiles is not None:
+        return lambda frame: tiles.sharpen(frame, scale)[1]
+    return lambda frame: laplacian_sharpen(frame, scale)[1]
+
+
+def _denoise_stage(region_size=4, method="auto", tiles=None):
+    """Median denoising (ImageDenoiser.denoise_array)."""
+    if tiles is not None:
+        return lambda frame: tiles.median(frame, region_size, method)
+    denoiser = ImageDenoiser(None)
+    return lambda frame: denoiser.denoise_array(frame, region_size, method)
+
+
+def _gamma_stage(gamma=1.13, in_place=False, tiles=None):
+    """
+    Gamma lookup (GammaCorrection); use 1 / gamma for the inverse correction.
+
+    in_place overwrites the previous stage's output instead of allocating a new frame.
+    """
+    if in_place:
+        corrector = GammaCorrection(None)
+        return lambda frame: corrector.apply_gamma_inplace(frame, gamma)
+    return lambda frame: apply_gamma(frame, gamma)
+
+
+# Stage types a StageGraph can be built from, with the function that creates each one.
+STAGE_TYPES = {
+    "whitebalance": _whitebalance_stage,
+    "demosaic": _demosaic_stage,
+    "sharpen": _sharpen_stage,
+    "denoise": _denoise_stage,
+    "gamma": _gamma_stage,
+}
+
+
+class Stage:
+    def __init__(self, stage_type, name=None, tiles=None, **params):
+        """
+        One step of a StageGraph plus the measurements taken while it runs.
+
+        Parameters:
+        - stage_type: str, key of STAGE_TYPES.
+        - name: str, label in the report (defaults to stage_type; must be unique in a graph).
+        - tiles: TileExecutor for the stages that support tiling (demosaic, sharpen, denoise).
+        - params: keyword arguments of the stage type (see the STAGE_TYPES functions).
+        """
+        if stage_type not in STAGE_TYPES:
+            raise ValueError(f"Unknown stage type: {stage_type}. Known types: {sorted(STAGE_TYPES)}")
+        self.stage_type = stage_type
+        self.name = name if name is not None else stage_type
+        self.params = params
+        self.run = STAGE_TYPES[stage_type](tiles=tiles, **params)
+        self.reset()
+
+    def reset(self):
+        """Clear the measurements."""
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.output_bytes = 0
+
+
+class StageGraph:
+    def __init__(self, stages, track_memory=False):
+        """
+        A linear graph of image processing stages, each timed as it runs.
+
+        Every frame passes through the stages in order, the output of one being the
+        input of the next. For each stage the graph records the wall time, the size of
+        its output and, with track_memory, the peak number of bytes it allocated on top
+        of what was already allocated (NumPy and OpenCV result buffers, via tracemalloc;
+        tracing slows the stages down, so timings are best taken without it).
+
+        Parameters:
+        - stages: list of Stage.
+        - track_memory: bool, measure allocations with tracemalloc.
+        """
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Stage names must be unique, got {names}")
+        self.stages = list(stages)
+        self.track_memory = track_memory
+        self.frames = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a graph from a dict, e.g. loaded from YAML:
+
+            track_memory: false
+            tile_size: 512        # optional, run tiling-capable stages tile-parallel
+            workers: 4            # threads for the tiles (defaults to the CPU count)
+            stages:
+              - type: whitebalance
+                percentile_value: 99.9
+              - type: sharpen
+                scale: 2.5
+        """
+        tiles = None
+        if config.get("tile_size"):
+            tiles = TileExecutor(config["tile_size"], config.get("workers"))
+        stages = []
+        for entry in config["stages"]:
+            params = dict(entry)
+            stages.append(Stage(params.pop("type"), tiles=tiles, **params))
+        return cls(stages, track_memory=config.get("track_memory", False))
+
+    @classmethod
+    def from_yaml(cls, path):
+        """Build a graph from a YAML file (see from_config for the layout)."""
+        import yaml
+        with open(path) as f:
+            return cls.from_config(yaml.safe_load(f))
+
+    def reset(self):
+        """Clear every measurement."""
+        self.frames = 0
+        self.seconds = 0.0
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, frame, keep_outputs=False):
+        """
+        Run one frame through every stage.
+
+        Returns:
+        - the last stage's output, or with keep_outputs a dict of every stage's output
+          keyed by stage name (in-place stages share their input's buffer).
+        """
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        outputs = {}
+        try:
+            for stage in self.stages:
+                if self.track_memory:
+                    allocated_before = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                start = time.perf_counter()
+                frame = stage.run(frame)
+                elapsed = time.perf_counter() - start
+                if self.track_memory:
+                    stage.peak_bytes = max(stage.peak_bytes, tracemalloc.get_traced_memory()[1] - allocated_before)
+                stage.calls += 1
+                stage.seconds += elapsed
+                stage.output_bytes = frame.nbytes
+                self.seconds += elapsed
+                if keep_outputs:
+                    outputs[stage.name] = frame
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        self.frames += 1
+        return outputs if keep_outputs else frame
+
+    def report(self):
+        """
+        Summarise the measurements so far.
+
+        Returns:
+        - dict with 'frames', 'seconds', 'frames_per_second' for the whole graph and
+          'stages': a list with each stage's 'name', 'type', 'calls', 'seconds',
+          'ms_per_frame', 'frames_per_second', 'share' (of the graph's time),
+          'output_bytes' and 'peak_bytes' (None unless track_memory).
+        """
+        stages = []
+        for stage in self.stages:
+            stages.append({
+                "name": stage.name,
+                "type": stage.stage_type,
+                "calls": stage.calls,
+                "seconds": stage.seconds,
+                "ms_per_frame": stage.seconds * 1000 / stage.calls if stage.calls else 0.0,
+                "frames_per_second": stage.calls / stage.seconds if stage.seconds > 0 else 0.0,
+                "share": stage.seconds / self.seconds if self.seconds > 0 else 0.0,
+                "output_bytes": stage.output_bytes,
+                "peak_bytes": stage.peak_bytes if self.track_memory else None,
+            })
+        return {
+            "frames": self.frames,
+            "seconds": self.seconds,
+            "frames_per_second": self.frames / self.seconds if self.seconds > 0 else 0.0,
+            "stages": stages,
+        }
+
+    def print_report(self):
+        """Print report() as a table and return it."""
+        report = self.report()
+        print(f"{report['frames']} frame(s) in {report['seconds']:.2f}s ({report['frames_per_second']:.2f} frames/s)")
+        print(f"{'stage':>14} {'ms/frame':>10} {'frames/s':>9} {'share':>6} {'peak MB':>8}")
+        for stage in report["stages"]:
+            peak = "-" if stage["peak_bytes"] is None else f"{stage['peak_bytes'] / 2 ** 20:.1f}"
+            print(f"{stage['name']:>14} {stage['ms_per_frame']:>10.1f} {stage['frames_per_second']:>9.2f} "
+                  f"{stage['share']:>6.1%} {peak:>8}")
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run images through a stage graph described in YAML.")
+    parser.add_argument("config", help="YAML stage graph (see traditionalPipeline.yml).")
+    parser.add_argument("images", nargs="+", help="Input images; a single-channel image is read as a Bayer mosaic.")
+    parser.add_argument("-output", help="Folder for the final images.")
+    parser.add_argument("-report", help="Write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    graph = StageGraph.from_yaml(args.config)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    for path in args.images:
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            parser.error(f"Could not read image: {path}")
+        output = graph.process(image)
+        if args.output:
+            extension = "jpg" if output.dtype == np.uint8 else "tif"
+            name = os.path.splitext(os.path.basename(path))[0]
+            cv2.imwrite(os.path.join(args.output, f"{name}_final.{extension}"), output)
+
+    report = graph.print_report()
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from demosaic import DemosaicProcessor
+from denoise import median_filter
+from sharpen import laplacian_sharpen
+
+# Halo (pixels of context on each side of a tile) each stage needs for exact results.
+SHARPEN_HALO = 1  # 3x3 Laplacian
+DEMOSAIC_HALOS = {
+    "bilinear": 2,  # diagonal then 4-neighbour 3x3 pass
+    "malvar": 2,  # 5x5 kernels
+    "ahd": 6,  # 5-tap green, two 3x3 passes, neighbour distances and a 3x3 homogeneity sum
+}
+
+
+def median_halo(region_size):
+    """Halo of median_filter: the window radius."""
+    return region_size // 2
+
+
+def tile_grid(height, width, tile_size, align=1):
+    """
+    Split a height x width frame into tiles of about tile_size pixels.
+
+    Tile origins are multiples of align (2 keeps every tile on the same Bayer phase).
+
+    Returns:
+    - list of (top, bottom, left, right) core rectangles covering the frame exactly once.
+    """
+    step = max(align, tile_size - tile_size % align)
+    return [(top, min(top + step, height), left, min(left + step, width))
+            for top in range(0, height, step) for left in range(0, width, step)]
+
+
+class TileExecutor:
+    def __init__(self, tile_size=512, workers=None):
+        """
+        Run a whole-frame function tile by tile on a thread pool.
+
+        Each tile is cut out with a halo of context pixels around its core, the function
+        runs on it, and only the core of the result is stitched into the output. With
+        a halo at least as large as the function's reach, every output pixel sees
+        exactly the neighbourhood it sees in whole-frame processing, and tiles on the
+        frame border keep the real border, so the result is identical to calling the
+        function on the whole frame. The stages are NumPy/OpenCV kernels that release
+        the GIL, so tiles run in parallel on plain threads.
+
+        Parameters:
+        - tile_size: int, core size of a tile in pixels (tiles are square).
+        - workers: int, number of threads (defaults to the CPU count).
+        """
+        self.tile_size = tile_size
+        self.workers = workers if workers is not None else os.cpu_count()
+        self._pool = None
+
+    def __getstate__(self):
+        # The thread pool stays behind when a pipeline is sent to a worker process.
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        """Shut the thread pool down (it is recreated on the next call)."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def run(self, func, image, halo, align=1):
+        """
+        Apply func to image tile by tile.
+
+        Parameters:
+        - func: callable taking an (h, w, ...) array and returning an array with the same
+          h and w (or a tuple of such arrays).
+        - image: np.ndarray of shape (H, W, ...).
+        - halo: int, pixels of context func needs on each side.
+        - align: int, tile origins (and halos) are kept multiples of align.
+
+        Returns:
+        - np.ndarray (or tuple of arrays) as func(image) would return.
+        """
+        height, width = image.shape[:2]
+        halo = -(-halo // align) * align
+        tiles = tile_grid(height, width, self.tile_size, align)
+
+        def process(tile):
+            top, bottom, left, right = tile
+            y0, x0 = max(0, top - halo), max(0, left - halo)
+            result = func(image[y0:min(height, bottom + halo), x0:min(width, right + halo)])
+            core = (slice(top - y0, bottom - y0), slice(left - x0, right - x0))
+            if isinstance(result, tuple):
+                return tuple(part[core] for part in result)
+            return result[core]
+
+        if len(tiles) == 1:
+            return func(image)
+
+        outputs = None
+        for (top, bottom, left, right), result in zip(tiles, self._executor().map(process, tiles)):
+            parts = result if isinstance(result, tuple) else (result,)
+            if outputs is None:
+                outputs = [np.empty((height, width) + part.shape[2:], dtype=part.dtype) for part in parts]
+            for output, part in zip(outputs, parts):
+                output[top:bottom, left:right] = part
+        return tuple(outputs) if isinstance(result, tuple) else outputs[0]
+
+    def median(self, array, region_size=3, method="auto"):
+        """Tiled median_filter."""
+        return self.run(lambda tile: median_filter(tile, region_size, method), array, median_halo(region_size))
+
+    def sharpen(self, array, scale=2.5):
+        """Tiled laplacian_sharpen: returns (edges, sharpened)."""
+        return self.run(lambda tile: laplacian_sharpen(tile, scale), array, SHARPEN_HALO)
+
+    def demosaic(self, raw, pattern="RGGB", white_level=None, out_dtype=np.uint8, method="bilinear"):
+        """
+        Tiled DemosaicProcessor.demosaic.
+
+        The white level defaults to the maximum of the whole mosaic, as in the
+        untiled call, and tiles start on even rows and columns so each keeps the
+        frame's CFA pattern.
+        """
+        if white_level is None:
+            white_level = np.max(raw)
+
+        def demosaic_tile(tile):
+            processor = DemosaicProcessor(None)
+            processor.raw_image = tile
+            return processor.demosaic(pattern, white_level, out_dtype, method)
+
+        return self.run(demosaic_tile, raw, DEMOSAIC_HALOS[method], align=2)
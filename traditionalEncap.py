@@ -1,83 +1,340 @@
 import os
-from whiteBalance import ImageProcessor
+import time
+import cv2
+from whiteBalance import ImageProcessor, histogram_white_points, render_whitebalance_figure
 from denoise import ImageDenoiser
-from sharpen import ImageSharpener
+from sharpen import ImageSharpener, laplacian_sharpen
 from GammaCorrection import GammaCorrection
+from colourTransform import ColourLUT
+from rawIngest import RawIngestor, is_raw_file
 from PIL import Image
 
+# Gamma-corrected images FramePipeline can produce: gamma_value applied, and its inverse.
+GAMMA_OUTPUTS = ("gamma", "gamma_corrected")
+
+# File name suffix of each gamma output written by TraditionalProcessor.
+FINAL_SUFFIXES = {"gamma": "_final", "gamma_corrected": "_final2"}
+
+# Intermediate stages that process_image can write to disk in in-memory mode.
+DUMP_STAGES = ("whitebalance", "histogram", "sharpen", "denoise")
+
+# FramePipeline owned by a pool worker process, created by init_worker.
+_worker_pipeline = None
+
+
+class FramePipeline:
+    def __init__(self, percentile_value=99.9, sharpen_scale=2.5, region_size=4, gamma_value=1.13,
+                 gamma_outputs=GAMMA_OUTPUTS, tile_executor=None):
+        """
+        Run white balance -> sharpen -> denoise -> gamma on a single frame buffer in memory.
+
+        Parameters:
+        - percentile_value: float, percentile used by the white balance.
+        - sharpen_scale: float, Laplacian scale used by the sharpening stage (None skips it).
+        - region_size: int, median filter region size used by the denoising stage (None skips it).
+        - gamma_value: float, gamma used by the final gamma correction.
+        - gamma_outputs: tuple of GAMMA_OUTPUTS entries to produce. With a single output the
+          lookup table is applied in place on the last stage's buffer (see in_place_stages),
+          so nothing is allocated for it and the stages sharing that buffer are not returned.
+        - tile_executor: TileExecutor running sharpening and denoising tile-parallel on
+          threads (same output, lower latency on 4K/8K frames); None runs them whole-frame.
+
+        When both sharpening and denoising are skipped, white balance and gamma are
+        compiled into one ColourLUT per gamma output and applied in a single pass.
+        """
+        self.percentile_value = percentile_value
+        self.sharpen_scale = sharpen_scale
+        self.region_size = region_size
+        self.gamma_value = gamma_value
+        self.gamma_outputs = tuple(gamma_outputs)
+        self.tile_executor = tile_executor
+        if not self.gamma_outputs or set(self.gamma_outputs).difference(GAMMA_OUTPUTS):
+            raise ValueError(f"gamma_outputs must be a non-empty subset of {GAMMA_OUTPUTS}")
+        # Seconds spent in each stage for the most recent frame.
+        self.stage_times = {}
+
+        # Stage objects are created once and reused for every frame.
+        self.white_balancer = ImageProcessor()
+        self.denoiser = ImageDenoiser(None)
+        self.gamma = GammaCorrection(None)
+
+    def in_place_stages(self):
+        """
+        Stages whose output buffer the single gamma output overwrites, so process() does
+        not return them: ('denoise',), or ('sharpen', 'denoise') when denoising is skipped
+        and passes the sharpened buffer on; () when nothing is overwritten (two gamma
+        outputs, or the fused white balance + gamma path).
+        """
+        if len(self.gamma_outputs) != 1 or (self.sharpen_scale is None and self.region_size is None):
+            return ()
+        return ("denoise",) if self.region_size is not None else ("sharpen", "denoise")
+
+    def process(self, frame, white_points=None):
+        """
+        Process one HxWx3 uint8 or uint16 frame. Every stage is channel-order agnostic, so
+        BGR frames from OpenCV go through unchanged, and uint16 frames (e.g. from
+        rawIngest) stay 16-bit through every stage.
+
+        white_points, if given, are the per-channel white balance white points to use
+        instead of the frame's own percentiles (e.g. from a VideoWhiteBalancer).
+
+        Returns:
+        - dict with the output of each stage: 'whitebalance', 'sharpen', 'denoise'
+          (except in_place_stages(), whose buffer holds the gamma output), and the
+          requested gamma_outputs: 'gamma' (gamma_value applied) and/or
+          'gamma_corrected' (inverse gamma). When the white points were estimated from
+          the frame, 'histograms' holds the white balance histogram data as returned by
+          ImageProcessor.percentile_whitebalance.
+        """
+        if self.sharpen_scale is None and self.region_size is None:
+            return self._process_fused(frame, white_points)
+
+        start = time.perf_counter()
+        histograms = None
+        if white_points is None:
+            whitebalanced, histograms = self.white_balancer.percentile_whitebalance(frame, self.percentile_value)
+        else:
+            whitebalanced = ColourLUT(white_points, bit_depth=frame.dtype.itemsize * 8).apply(frame)
+        after_whitebalance = time.perf_counter()
+        sharpened = whitebalanced
+        if self.sharpen_scale is not None:
+            if self.tile_executor is not None:
+                _, sharpened = self.tile_executor.sharpen(whitebalanced, self.sharpen_scale)
+            else:
+                _, sharpened = laplacian_sharpen(whitebalanced, self.sharpen_scale)
+        after_sharpen = time.perf_counter()
+        denoised = sharpened
+        if self.region_size is not None:
+            if self.tile_executor is not None:
+                denoised = self.tile_executor.median(sharpened, self.region_size)
+            else:
+                denoised = self.denoiser.denoise_array(sharpened, self.region_size)
+        after_denoise = time.perf_counter()
+
+        outputs = {"whitebalance": whitebalanced, "sharpen": sharpened, "denoise": denoised}
+        if histograms is not None:
+            outputs["histograms"] = histograms
+        if len(self.gamma_outputs) == 1:
+            output = self.gamma_outputs[0]
+            gamma = self.gamma_value if output == "gamma" else 1 / self.gamma_value
+            # The lookup table overwrites the last stage's buffer, so those stages are no longer available.
+            for stage in self.in_place_stages():
+                del outputs[stage]
+            outputs[output] = self.gamma.apply_gamma_inplace(denoised, gamma)
+        else:
+            self.gamma.image = denoised
+            self.gamma.apply_gamma_correction(self.gamma_value, verbose=False)
+            outputs["gamma"] = self.gamma.gamma_image
+            outputs["gamma_corrected"] = self.gamma.gamma_corrected_image
+
+        self.stage_times = {
+            "whitebalance": after_whitebalance - start,
+            "sharpen": after_sharpen - after_whitebalance,
+            "denoise": after_denoise - after_sharpen,
+            "gamma": time.perf_counter() - after_denoise,
+        }
+        return outputs
+
+    def _process_fused(self, frame, white_points=None):
+        """White balance and gamma as one compiled lookup table per requested output."""
+        start = time.perf_counter()
+        if white_points is None:
+            white_points, _ = histogram_white_points(frame, self.percentile_value)
+        outputs = {}
+        for output in self.gamma_outputs:
+            gamma = self.gamma_value if output == "gamma" else 1 / self.gamma_value
+            outputs[output] = ColourLUT(white_points, gamma, frame.dtype.itemsize * 8).apply(frame)
+        self.stage_times = {"whitebalance+gamma": time.perf_counter() - start}
+        return outputs
+
+
+def init_worker(pipeline=None):
+    """
+    Process-pool initializer: give the worker its own FramePipeline, reused for every
+    frame it handles, and a single OpenCV thread so workers do not oversubscribe cores.
+    """
+    global _worker_pipeline
+    cv2.setNumThreads(1)
+    _worker_pipeline = pipeline if pipeline is not None else FramePipeline()
+
+
+def worker_pipeline():
+    """Return the FramePipeline created by init_worker in this process."""
+    return _worker_pipeline
+
 
 class TraditionalProcessor:
-    def __init__(self, input_path, output_base_folder):
+    def __init__(self, input_path, output_base_folder, in_memory=True, dump_stages=(), pipeline=None,
+                 raw_ingestor=None):
         """
         Initialize the processor for a single image, and prepare output folders for each stage.
 
         Parameters:
         - input_path: str, path to the input image file.
         - output_base_folder: str, path to the base output folder where processed images will be saved.
+        - in_memory: bool, pass one frame buffer through all stages instead of saving and
+          reloading a JPEG between stages (whose re-quantisation changes the output by a
+          few levels, see process_via_files).
+        - dump_stages: iterable of DUMP_STAGES entries to also write to disk in in-memory mode
+          (stages the pipeline skips are not written).
+        - pipeline: FramePipeline, reused across images when given.
+        - raw_ingestor: RawIngestor used when input_path is a RAW file or Bayer dump (see
+          rawIngest.is_raw_file). Such input is demosaiced straight into the pipeline and
+          processed at 16 bits; its stage images are written as 16-bit TIFFs.
         """
         self.input_path = input_path
         self.output_base_folder = output_base_folder
         self.base_name = os.path.splitext(os.path.basename(self.input_path))[0]  # Extract unique name from input image
-        
+        self.in_memory = in_memory
+        self.dump_stages = set(dump_stages)
+        self.pipeline = pipeline if pipeline is not None else FramePipeline()
+        self.raw_ingestor = raw_ingestor
+        # Filled by process_image: per-stage seconds (in-memory mode) or the error raised.
+        self.stage_times = {}
+        self.error = None
+
+        unknown = self.dump_stages.difference(DUMP_STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages to dump: {sorted(unknown)}")
+        if not self.in_memory and is_raw_file(self.input_path):
+            raise ValueError("RAW input is only supported with in_memory=True.")
+        overwritten = self.dump_stages.intersection(self.pipeline.in_place_stages()) if self.in_memory else set()
+        if overwritten:
+            raise ValueError(f"The pipeline applies gamma in place on {sorted(overwritten)}, so they cannot be "
+                             f"dumped; request both gamma outputs to keep them.")
+
         # Create subfolders for each stage
         self.whitebalanced_folder = os.path.join(self.output_base_folder, 'whiteBalanced')
         self.sharpen_folder = os.path.join(self.output_base_folder, 'sharpen')
         self.denoise_folder = os.path.join(self.output_base_folder, 'denoise')
         self.gamma_folder = os.path.join(self.output_base_folder, 'gamma')
-        
+
         # Ensure each folder exists
-        os.makedirs(self.whitebalanced_folder, exist_ok=True)
-        os.makedirs(self.sharpen_folder, exist_ok=True)
-        os.makedirs(self.denoise_folder, exist_ok=True)
         os.makedirs(self.gamma_folder, exist_ok=True)
+        if not self.in_memory or self.dump_stages & {"whitebalance", "histogram"}:
+            os.makedirs(self.whitebalanced_folder, exist_ok=True)
+        if not self.in_memory or "sharpen" in self.dump_stages:
+            os.makedirs(self.sharpen_folder, exist_ok=True)
+        if not self.in_memory or "denoise" in self.dump_stages:
+            os.makedirs(self.denoise_folder, exist_ok=True)
 
     def process_image(self):
+        """Process the image; returns True on success, False (with self.error set) on failure."""
+        if self.in_memory:
+            return self.process_in_memory()
+        return self.process_via_files()
+
+    def load_frame(self):
+        """Load the input as a BGR frame: uint16 straight from the demosaic for RAW input, else uint8."""
+        if is_raw_file(self.input_path):
+            ingestor = self.raw_ingestor if self.raw_ingestor is not None else RawIngestor()
+            return ingestor.load(self.input_path)
+        return ImageProcessor(self.input_path).image
+
+    def process_in_memory(self):
+        """Run all stages on one frame buffer; only the final images and requested dumps hit the disk."""
+        try:
+            frame = self.load_frame()
+            stages = self.pipeline.process(frame)
+            self.stage_times = dict(self.pipeline.stage_times)
+            # JPEG is 8-bit only, so 16-bit frames are written as TIFF.
+            extension = "jpg" if frame.dtype == "uint8" else "tif"
+
+            if "whitebalance" in self.dump_stages and "whitebalance" in stages:
+                cv2.imwrite(os.path.join(self.whitebalanced_folder, f"{self.base_name}_whitebalanced.{extension}"),
+                            stages["whitebalance"])
+            if "histogram" in self.dump_stages and "histograms" in stages:
+                histogram_path = os.path.join(self.whitebalanced_folder, f"{self.base_name}_histogram.jpg")
+                render_whitebalance_figure(frame, stages["whitebalance"], stages["histograms"], histogram_path)
+            if "sharpen" in self.dump_stages and "sharpen" in stages:
+                cv2.imwrite(os.path.join(self.sharpen_folder, f"{self.base_name}_sharpened.{extension}"),
+                            stages["sharpen"])
+            if "denoise" in self.dump_stages and "denoise" in stages:
+                cv2.imwrite(os.path.join(self.denoise_folder, f"{self.base_name}_denoised.{extension}"),
+                            stages["denoise"])
+
+            # Only the gamma outputs the pipeline produced: 'gamma' -> _final, 'gamma_corrected' -> _final2.
+            final_paths = {}
+            for output in self.pipeline.gamma_outputs:
+                final_paths[output] = os.path.join(self.gamma_folder,
+                                                   f"{self.base_name}{FINAL_SUFFIXES[output]}.{extension}")
+            for output, path in final_paths.items():
+                cv2.imwrite(path, stages[output])
+            final_output_path = final_paths.get("gamma", next(iter(final_paths.values())))
+
+            print(f"Processing completed for {self.input_path}. Final image saved to {final_output_path}.")
+            return True
+
+        except Exception as e:
+            print(f"Error processing {self.input_path}: {e}")
+            self.error = e
+            return False
+
+    def process_via_files(self):
+        """
+        Original stage-by-stage processing that saves and reloads an image between stages.
+
+        Stages the pipeline skips (sharpen_scale or region_size None) pass the previous
+        stage's file on. Every stage is re-read from a JPEG, so the final images differ
+        from in-memory mode by JPEG re-quantisation: about 4 levels on average on smooth
+        input, more where sharpening amplifies the JPEG artefacts. That difference is
+        expected.
+        """
         try:
             # Step 1: White Balance
             white_balance_path = os.path.join(self.whitebalanced_folder, f"{self.base_name}_whitebalanced.jpg")
             histogram_path = os.path.join(self.whitebalanced_folder, f"{self.base_name}_histogram.jpg")
             processor = ImageProcessor(self.input_path)
-            processor.process_and_display(percentile_value=99.9, save_path=white_balance_path, save_path2=histogram_path)
+            processor.process_and_display(percentile_value=self.pipeline.percentile_value,
+                                          save_path=white_balance_path, save_path2=histogram_path)
 
             # Step 2: Sharpening (Use the white balanced image for this step)
-            sharpen_path = os.path.join(self.sharpen_folder, f"{self.base_name}_sharpened.jpg")
-            processor = ImageSharpener(white_balance_path)
-            edges, sharpened_img = processor.sharpen()
-            # sharpened_img.save(sharpen_path)
-            
-            # Create a combined image for comparison
-            comparison = Image.new("RGB", (processor.img.width * 3, processor.img.height))
-            comparison.paste(processor.img, (0, 0))
-            comparison.paste(edges, (processor.img.width, 0))
-            comparison.paste(sharpened_img, (processor.img.width * 2, 0))
-                
-            # Save and show the sharpened (third frame) from comparison
-            sharpened_frame = comparison.crop((
-                processor.img.width * 2,  # Left
-                0,                       # Top
-                processor.img.width * 3,  # Right
-                processor.img.height      # Bottom
-            ))
-            sharpened_frame.save(sharpen_path)
-            
+            current_path = white_balance_path
+            if self.pipeline.sharpen_scale is not None:
+                sharpen_path = os.path.join(self.sharpen_folder, f"{self.base_name}_sharpened.jpg")
+                processor = ImageSharpener(current_path)
+                edges, sharpened_img = processor.sharpen(scale=self.pipeline.sharpen_scale)
+                # sharpened_img.save(sharpen_path)
+
+                # Create a combined image for comparison
+                comparison = Image.new("RGB", (processor.img.width * 3, processor.img.height))
+                comparison.paste(processor.img, (0, 0))
+                comparison.paste(edges, (processor.img.width, 0))
+                comparison.paste(sharpened_img, (processor.img.width * 2, 0))
+
+                # Save and show the sharpened (third frame) from comparison
+                sharpened_frame = comparison.crop((
+                    processor.img.width * 2,  # Left
+                    0,                       # Top
+                    processor.img.width * 3,  # Right
+                    processor.img.height      # Bottom
+                ))
+                sharpened_frame.save(sharpen_path)
+                current_path = sharpen_path
+
 
             # Step 3: Denoising (Use the sharpened image for this step)
-            denoise_path = os.path.join(self.denoise_folder, f"{self.base_name}_denoised.jpg")
-            processor = ImageDenoiser(sharpen_path)
-            processor.load_image()
-            denoised_image = processor.denoise_rgb(region_size=4)
-            processor.save_image(denoised_image, denoise_path)
+            if self.pipeline.region_size is not None:
+                denoise_path = os.path.join(self.denoise_folder, f"{self.base_name}_denoised.jpg")
+                processor = ImageDenoiser(current_path)
+                processor.load_image()
+                denoised_image = processor.denoise_rgb(region_size=self.pipeline.region_size)
+                processor.save_image(denoised_image, denoise_path)
+                current_path = denoise_path
 
             # Step 4: Gamma Correction (Use the denoised image for this step)
             final_output_path = os.path.join(self.gamma_folder, f"{self.base_name}_final.jpg")
             final_output_path2 = os.path.join(self.gamma_folder, f"{self.base_name}_final2.jpg")
-            
-            processor = GammaCorrection(denoise_path)
+
+            processor = GammaCorrection(current_path)
             processor.load_image()
-            processor.apply_gamma_correction(gamma_value=1.13)
+            processor.apply_gamma_correction(gamma=self.pipeline.gamma_value)
             processor.save_images(final_output_path, final_output_path2)
 
             print(f"Processing completed for {self.input_path}. Final image saved to {final_output_path}.")
+            return True
 
         except Exception as e:
             print(f"Error processing {self.input_path}: {e}")
+            self.error = e
+            return False
@@ -1,36 +1,126 @@
-from traditionalEncap import TraditionalProcessor
+from concurrent.futures import ProcessPoolExecutor
+from traditionalEncap import TraditionalProcessor, FramePipeline, init_worker, worker_pipeline
+from rawIngest import RAW_EXTENSIONS
 import os
+import time
+
+
+def _process_one(input_path, output_folder, pipeline=None, raw_ingestor=None):
+    """
+    Process a single image and summarise the outcome.
+
+    Returns:
+    - dict with 'input_path', 'ok', 'error' (str or None), 'stage_times' and 'seconds'.
+    """
+    start = time.perf_counter()
+    try:
+        # Setting up can fail too (e.g. creating the output folders): report it like a processing error.
+        processor = TraditionalProcessor(input_path, output_folder,
+                                         pipeline=pipeline if pipeline is not None else worker_pipeline(),
+                                         raw_ingestor=raw_ingestor)
+    except Exception as e:
+        print(f"Error setting up {input_path}: {e}")
+        return {
+            "input_path": input_path,
+            "ok": False,
+            "error": repr(e),
+            "stage_times": {},
+            "seconds": time.perf_counter() - start,
+        }
+    ok = processor.process_image()
+    return {
+        "input_path": input_path,
+        "ok": ok,
+        "error": None if ok else repr(processor.error),
+        "stage_times": processor.stage_times,
+        "seconds": time.perf_counter() - start,
+    }
+
 
 class BatchImageProcessor:
-    def __init__(self, input_folder, output_folder):
+    def __init__(self, input_folder, output_folder, workers=1, raw_ingestor=None):
         """
         Initialize the batch processor for images in a folder.
 
         Parameters:
         - input_folder: str, path to the folder containing input images.
         - output_folder: str, path to the base folder where processed images will be saved (for each stage).
+        - workers: int, number of worker processes; 1 processes the images in this process.
+        - raw_ingestor: RawIngestor for the camera RAW files in the folder (defaults to
+          rawpy's metadata); RAW files are demosaiced in memory and processed at 16 bits.
         """
         self.input_folder = input_folder
         self.output_folder = output_folder
+        self.workers = workers
+        self.raw_ingestor = raw_ingestor
         os.makedirs(self.output_folder, exist_ok=True)
 
     def process_all_images(self):
         """
         Process all images in the input folder, stage by stage.
+
+        Images are handled in sorted filename order and output names only depend on the
+        input name, so results are identical for any worker count. A failing image is
+        reported in the summary and does not stop the batch.
+
+        Returns:
+        - dict throughput report (see report()).
+        """
+        image_files = sorted(f for f in os.listdir(self.input_folder)
+                             if f.lower().endswith(('.jpg', '.png', '.jpeg') + RAW_EXTENSIONS))
+        input_paths = [os.path.join(self.input_folder, image_file) for image_file in image_files]
+
+        start = time.perf_counter()
+        if self.workers <= 1:
+            pipeline = FramePipeline()
+            results = []
+            for input_path in input_paths:
+                print(f"Processing {input_path}...")
+                results.append(_process_one(input_path, self.output_folder, pipeline, self.raw_ingestor))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+                results = list(executor.map(_process_one, input_paths, [self.output_folder] * len(input_paths),
+                                            [None] * len(input_paths), [self.raw_ingestor] * len(input_paths)))
+
+        return self.report(results, time.perf_counter() - start)
+
+    def report(self, results, elapsed):
         """
-        image_files = [f for f in os.listdir(self.input_folder) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
+        Print and return a throughput summary for a finished batch.
+
+        Returns:
+        - dict with 'frames', 'failed' (list of (input_path, error)), 'elapsed',
+          'frames_per_second' and 'stage_ms' (mean milliseconds per stage over successful frames).
+        """
+        succeeded = [result for result in results if result["ok"]]
+        failed = [(result["input_path"], result["error"]) for result in results if not result["ok"]]
+
+        stage_ms = {}
+        for result in succeeded:
+            for stage, seconds in result["stage_times"].items():
+                stage_ms[stage] = stage_ms.get(stage, 0.0) + seconds * 1000
+        for stage in stage_ms:
+            stage_ms[stage] /= len(succeeded)
+
+        summary = {
+            "frames": len(results),
+            "failed": failed,
+            "elapsed": elapsed,
+            "frames_per_second": len(succeeded) / elapsed if elapsed > 0 else 0.0,
+            "stage_ms": stage_ms,
+        }
 
-        for image_file in image_files:
-            input_path = os.path.join(self.input_folder, image_file)
-            print(f"Processing {input_path}...")
-            
-            # Process image through all stages (whiteBalance, sharpen, denoise, gamma)
-            processor = TraditionalProcessor(input_path, self.output_folder)
-            processor.process_image()
+        print(f"Processed {len(succeeded)}/{len(results)} images in {elapsed:.2f}s "
+              f"({summary['frames_per_second']:.2f} frames/s, {self.workers} worker(s)).")
+        for stage, ms in stage_ms.items():
+            print(f"  {stage}: {ms:.1f} ms/frame")
+        for input_path, error in failed:
+            print(f"  Failed: {input_path}: {error}")
+        return summary
 
 if __name__ == "__main__":
     input_folder = "/mnt/c/Users/sofin/Documents/_Current Classes/ECE722/C0004/original"
     output_folder = "/mnt/c/Users/sofin/Documents/_Current Classes/ECE722/C0004/final"
 
-    batch_processor = BatchImageProcessor(input_folder, output_folder)
+    batch_processor = BatchImageProcessor(input_folder, output_folder, workers=os.cpu_count())
     batch_processor.process_all_images()
@@ -1,13 +1,114 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 from PIL import Image
-import matplotlib.pyplot as plt
 from skimage import img_as_ubyte
+from colourTransform import ColourLUT
+
+# Matplotlib is imported lazily by the plotting helpers so headless white balancing
+# never loads it.
+
+# Most pixels histogrammed per cv2.calcHist call (its float32 counts are exact up to 2**24)
+HISTOGRAM_BAND_PIXELS = 2 ** 24
+
+def histogram_percentile(histogram, percentile_value):
+    """
+    Percentile of integer data from its histogram, without sorting.
+
+    Reproduces np.percentile (linear interpolation) exactly: the two order statistics
+    around the virtual index are looked up in the cumulative counts and interpolated
+    the same way NumPy does. For uint8 data this is O(N) for the histogram plus O(256).
+    """
+    # Integer running sum: float32 counts stop being exact above 2**24 pixels
+    counts = np.cumsum(histogram, dtype=np.int64)
+    n = int(counts[-1])
+    virtual_index = (n - 1) * (percentile_value / 100)
+    if virtual_index >= n - 1:
+        return float(np.searchsorted(counts, n - 1, side="right"))
+    lower = np.floor(virtual_index)
+    t = virtual_index - lower
+    below = int(np.searchsorted(counts, lower, side="right"))
+    above = int(np.searchsorted(counts, lower + 1, side="right"))
+    diff = above - below
+    return float(above - diff * (1 - t) if t >= 0.5 else below + diff * t)
+
+
+def histogram_white_points(image, percentile_value):
+    """
+    Per-channel percentiles of an HxWxC uint8 or uint16 image from one-bin-per-value histograms.
+
+    Returns:
+    - white_points: list of floats, equal to np.percentile(image, percentile_value, axis=(0, 1)).
+    - counts: list of the per-channel histograms (int64 arrays of 256 or 65536 counts).
+    """
+    bins = 256 if image.dtype == np.uint8 else 65536
+    # cv2.calcHist counts in float32, exact only up to 2**24 per bin, so frames
+    # larger than that (e.g. 8K) are counted in row bands summed as integers.
+    rows = max(1, HISTOGRAM_BAND_PIXELS // image.shape[1])
+    counts = [np.zeros(bins, dtype=np.int64) for _ in range(image.shape[2])]
+    for top in range(0, image.shape[0], rows):
+        band = image[top:top + rows]
+        for channel in range(image.shape[2]):
+            counts[channel] += cv2.calcHist([band], [channel], None, [bins], [0, bins]).ravel().astype(np.int64)
+    white_points = [histogram_percentile(count, percentile_value) for count in counts]
+    return white_points, counts
+
+
+def draw_whitebalance_axes(axes, original, whitebalanced, histograms):
+    """Draw the original and balanced BGR images and the channel histograms on a 2x2 grid of axes."""
+    if original.dtype == np.uint16:
+        # imshow only takes 8-bit or [0, 1] float colour images
+        original = original * np.float32(1 / 65535)
+        whitebalanced = whitebalanced * np.float32(1 / 65535)
+
+    # Display the original image
+    axes[0, 0].imshow(cv2.cvtColor(original, cv2.COLOR_BGR2RGB))
+    axes[0, 0].set_title('Original Image')
+    axes[0, 0].axis('off')
+
+    # Display the processed image
+    axes[0, 1].imshow(cv2.cvtColor(whitebalanced, cv2.COLOR_BGR2RGB))
+    axes[0, 1].set_title('Whitebalanced Image')
+    axes[0, 1].axis('off')
+
+    # Display the histogram
+    colors = ['r', 'g', 'b']
+    for channel, color in enumerate(colors):
+        values, percentile = histograms[channel]
+        axes[1, 0].step(np.arange(len(values)), values, c=color)
+        axes[1, 0].axvline(percentile, ls='--', c=color, label=f'{color.upper()} max = {percentile:.2f}')
+    axes[1, 0].set_xlim(0, len(histograms[0][0]) - 1)
+    axes[1, 0].set_xlabel('Pixel Value')
+    axes[1, 0].set_ylabel('Fraction of Pixels')
+    axes[1, 0].set_title('Histogram of RGB Channels')
+    axes[1, 0].legend()
+
+    # Leave the bottom-right empty
+    axes[1, 1].axis('off')
+
+
+def render_whitebalance_figure(original, whitebalanced, histograms, save_path):
+    """
+    Save the white balance diagnostic figure without pyplot.
+
+    Uses a standalone matplotlib Figure, so nothing is registered with pyplot (the
+    figure is freed once this returns) and it can run off the main thread.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 10))
+    draw_whitebalance_axes(fig.subplots(2, 2), original, whitebalanced, histograms)
+    fig.tight_layout()
+    fig.savefig(save_path)
+
 
 class ImageProcessor:
-    def __init__(self, image_path):
+    def __init__(self, image_path=None):
+        """Load the image at image_path, or start empty to white-balance frames passed in directly."""
         self.image_path = image_path
-        self.image = self._load_image()
+        self.image = self._load_image() if image_path is not None else None
 
     def _load_image(self):
         """Load an image from a TIFF file and convert it to a NumPy array."""
@@ -25,19 +126,26 @@ class ImageProcessor:
         return image
 
     def percentile_whitebalance(self, image, percentile_value=95):
-        """Perform white balancing using the specified percentile value."""
-        # Normalize using the calculated percentile values
-        whitebalanced = img_as_ubyte(
-            (image * 1.0 / np.percentile(image, percentile_value, axis=(0, 1)))
-            .clip(0, 1)
-        )
+        """
+        Perform white balancing using the specified percentile value.
+
+        uint16 images (e.g. demosaiced RAW frames) stay 16-bit: the white point maps to 65535.
+        """
+        if image.dtype in (np.uint8, np.uint16) and image.ndim == 3:
+            # Exact percentiles from one histogram per channel, then one table lookup;
+            # same result as the float path below without sorting or float images
+            white_points, counts = histogram_white_points(image, percentile_value)
+            whitebalanced = ColourLUT(white_points, bit_depth=image.dtype.itemsize * 8).apply(image)
+        else:
+            # Normalize using the calculated percentile values
+            white_points = np.percentile(image, percentile_value, axis=(0, 1))
+            whitebalanced = img_as_ubyte((image * 1.0 / white_points).clip(0, 1))
+            counts = [np.bincount(image[:, :, channel].flatten(), minlength=256) for channel in range(3)]
 
         # Prepare data for histogram
         histograms = []
         for channel in range(3):
-            channel_values = image[:, :, channel]
-            value = np.percentile(channel_values, percentile_value)
-            histograms.append((np.bincount(channel_values.flatten(), minlength=256) * 1.0 / channel_values.size, value))
+            histograms.append((counts[channel] * 1.0 / image[:, :, channel].size, white_points[channel]))
 
         return whitebalanced, histograms
 
@@ -52,33 +160,9 @@ class ImageProcessor:
             print(f"Processed image saved to: {save_path}")
 
         # Create the plot
+        import matplotlib.pyplot as plt
         fig, axes = plt.subplots(2, 2, figsize=(12, 10))
-
-        # Display the original image
-        axes[0, 0].imshow(cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
-        axes[0, 0].set_title('Original Image')
-        axes[0, 0].axis('off')
-
-        # Display the processed image
-        axes[0, 1].imshow(cv2.cvtColor(whitebalanced, cv2.COLOR_BGR2RGB))
-        axes[0, 1].set_title('Whitebalanced Image')
-        axes[0, 1].axis('off')
-
-        # Display the histogram
-        colors = ['r', 'g', 'b']
-        for channel, color in enumerate(colors):
-            values, percentile = histograms[channel]
-            axes[1, 0].step(np.arange(256), values, c=color)
-            axes[1, 0].axvline(percentile, ls='--', c=color, label=f'{color.upper()} max = {percentile:.2f}')
-        axes[1, 0].set_xlim(0, 255)
-        axes[1, 0].set_xlabel('Pixel Value')
-        axes[1, 0].set_ylabel('Fraction of Pixels')
-        axes[1, 0].set_title('Histogram of RGB Channels')
-        axes[1, 0].legend()
-
-        # Leave the bottom-right empty
-        axes[1, 1].axis('off')
-
+        draw_whitebalance_axes(axes, self.image, whitebalanced, histograms)
         plt.tight_layout()
 
         # Save the matplotlib figure if a save path is provided
@@ -87,6 +171,134 @@ class ImageProcessor:
             print(f"Figure saved to: {save_path2}")
 
         # plt.show()
+        # Close the figure so repeated calls do not accumulate open figures
+        plt.close(fig)
+
+    def balance(self, percentile_value=95, with_histograms=False):
+        """
+        Headless white balance of the loaded image; never touches matplotlib.
+
+        Returns:
+        - whitebalanced: np.ndarray, the balanced BGR image.
+        - histograms: list of (fraction of pixels per value, percentile) per channel if
+          with_histograms is True, otherwise None.
+        """
+        whitebalanced, histograms = self.percentile_whitebalance(self.image, percentile_value)
+        return whitebalanced, (histograms if with_histograms else None)
+
+
+class VideoWhiteBalancer:
+    def __init__(self, percentile_value=99.9, subsample=1, smoothing=None):
+        """
+        Percentile white balance for video frames.
+
+        White points come from 256-bin histograms (exact for uint8, no sort), can be
+        estimated on a subsampled grid of pixels, and can be smoothed over time with an
+        exponential moving average so the balance does not flicker between frames.
+
+        Parameters:
+        - percentile_value: float, percentile mapped to white, as in percentile_whitebalance.
+        - subsample: int, use every subsample-th pixel in each direction for the estimate.
+        - smoothing: float in (0, 1] or None, weight of the newest frame in the moving
+          average; None uses each frame's own white points.
+        """
+        if smoothing is not None and not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1] or None")
+        self.percentile_value = percentile_value
+        self.subsample = max(1, int(subsample))
+        self.smoothing = smoothing
+        self.white_points = None
+
+    def reset(self):
+        """Forget the smoothed white points, e.g. at a scene cut."""
+        self.white_points = None
+
+    def estimate(self, frame):
+        """Update and return the (smoothed) per-channel white points for an HxWx3 uint8 or uint16 frame."""
+        sample = frame
+        if self.subsample > 1:
+            # Nearest-neighbour downscaling picks a regular pixel grid much faster than
+            # copying a strided NumPy view.
+            height, width = frame.shape[:2]
+            sample = cv2.resize(frame, (max(1, width // self.subsample), max(1, height // self.subsample)),
+                                interpolation=cv2.INTER_NEAREST)
+        white_points = np.array(histogram_white_points(sample, self.percentile_value)[0])
+
+        if self.smoothing is None or self.white_points is None:
+            self.white_points = white_points
+        else:
+            self.white_points = (1 - self.smoothing) * self.white_points + self.smoothing * white_points
+        return self.white_points
+
+    def balance(self, frame, dst=None):
+        """White-balance a frame with the updated white points (dst may be frame for in place)."""
+        return ColourLUT(self.estimate(frame), bit_depth=frame.dtype.itemsize * 8).apply(frame, dst=dst)
+
+
+class WhiteBalanceDiagnostics:
+    def __init__(self, output_folder, every=30, max_width=960):
+        """
+        Sampled, asynchronous white balance figures for long frame sequences.
+
+        Every `every`-th submitted frame is copied and handed to a background thread,
+        which applies the white balance, computes the histograms and renders the figure.
+        If the previous figure is still rendering the sample is dropped, so the caller
+        never waits and at most one frame copy is held.
+
+        Parameters:
+        - output_folder: str, folder the figures are written to.
+        - every: int, render one figure per this many submitted frames.
+        - max_width: int, images are downscaled to this width for display.
+        """
+        self.output_folder = output_folder
+        self.every = max(1, int(every))
+        self.max_width = max_width
+        self.submitted = 0
+        self.dropped = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        os.makedirs(self.output_folder, exist_ok=True)
+
+    def submit(self, frame, white_points, name=None):
+        """
+        Offer one HxWx3 uint8 BGR frame and the white points used to balance it.
+
+        Returns:
+        - the Future of the scheduled render, or None if the frame was not sampled.
+        """
+        with self._lock:
+            index = self.submitted
+            self.submitted += 1
+            if index % self.every:
+                return None
+            if self._pending is not None and not self._pending.done():
+                self.dropped += 1
+                return None
+            name = name if name is not None else f"frame_{index:06d}"
+            self._pending = self._executor.submit(self._render, frame.copy(), list(white_points), name)
+            return self._pending
+
+    def _render(self, frame, white_points, name):
+        """Balance the frame, compute its histograms and save the figure (background thread)."""
+        whitebalanced = ColourLUT(white_points).apply(frame)
+        histograms = [(np.bincount(frame[:, :, channel].ravel(), minlength=256) * 1.0 / frame[:, :, channel].size,
+                       white_points[channel])
+                      for channel in range(3)]
+
+        height, width = frame.shape[:2]
+        if width > self.max_width:
+            size = (self.max_width, max(1, height * self.max_width // width))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            whitebalanced = cv2.resize(whitebalanced, size, interpolation=cv2.INTER_AREA)
+
+        save_path = os.path.join(self.output_folder, f"{name}_histogram.jpg")
+        render_whitebalance_figure(frame, whitebalanced, histograms, save_path)
+        return save_path
+
+    def close(self):
+        """Wait for the last figure and stop the background thread."""
+        self._executor.shutdown(wait=True)
 
 
 # Example usage
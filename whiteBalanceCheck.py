@@ -0,0 +1,48 @@
+import argparse
+import sys
+import numpy as np
+from whiteBalance import histogram_white_points, histogram_percentile
+
+# 8K UHD: 33177600 pixels per channel, above the 2**24 float32 limit of cv2.calcHist
+FRAME_SHAPE = (4320, 7680, 3)
+
+
+def test_frames(seed=0):
+    """8K frames whose white points need exact counts: uniform noise, and one where a single
+    value covers more than 2**24 pixels of a channel."""
+    rng = np.random.default_rng(seed)
+    frames = {'uint8 noise': rng.integers(0, 256, FRAME_SHAPE, dtype=np.uint8)}
+    saturated = rng.integers(0, 256, FRAME_SHAPE, dtype=np.uint8)
+    saturated[:3000] = 255
+    frames['uint8 saturated'] = saturated
+    frames['uint16 noise'] = rng.integers(0, 65536, FRAME_SHAPE, dtype=np.uint16)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare histogram white points with np.percentile on 8K frames.')
+    parser.add_argument('-step', type=float, default=0.001, help='Percentile step of the scan over [0, 100].')
+    args = parser.parse_args()
+
+    percentiles = np.round(np.arange(0, 100 + args.step / 2, args.step), 6)
+    failed = False
+    for name, frame in test_frames().items():
+        _, counts = histogram_white_points(frame, 50)
+        mismatches = 0
+        for channel in range(frame.shape[2]):
+            total = int(counts[channel].sum())
+            if total != frame.shape[0] * frame.shape[1]:
+                print('{} channel {}: histogram total {} != {}'.format(name, channel, total, frame.shape[0] * frame.shape[1]))
+                mismatches += 1
+            expected = np.percentile(frame[:, :, channel], percentiles)
+            computed = np.array([histogram_percentile(counts[channel], p) for p in percentiles])
+            mismatches += int(np.count_nonzero(computed != expected))
+        failed = failed or mismatches > 0
+        print('{}: {} percentiles x {} channels, {} mismatches ({})'.format(
+            name, len(percentiles), frame.shape[2], mismatches, 'ok' if mismatches == 0 else 'FAILED'))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()